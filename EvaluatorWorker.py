@@ -2,29 +2,67 @@ import datetime
 
 from PyQt5.QtCore import QObject, QRunnable, pyqtSignal, pyqtSlot
 
-from evaluator import Evaluator
+from engines import DEFAULT_ENGINE, create_evaluator
+from instrumentation import Instrumentation
+from jobs import PROGRESS_INTERVAL, CancellationToken, JobCancelled, ThrottledSignals
 
 
 class Signals(QObject):
+    started = pyqtSignal()
     finished_with_results = pyqtSignal(tuple)
     report_progress = pyqtSignal(tuple)
+    # error message of an evaluation that raised
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    # typed events of instrumentation.Instrumentation (StageFinished, CounterUpdated...)
+    instrumentation_event = pyqtSignal(object)
 
 
 class EvaluatorWorker(QRunnable):
 
-    def __init__(self: 'EvaluatorWorker', rgbFolder: str, wavFile: str):
+    def __init__(self: 'EvaluatorWorker', rgbFolder: str, wavFile: str, engine: str = DEFAULT_ENGINE,
+                 profile: bool = False, progress_interval: float = PROGRESS_INTERVAL, **options):
         super(EvaluatorWorker, self).__init__()
         self.rgbFolder = rgbFolder
         self.wavFile = wavFile
+        self.engine = engine
+        # engine specific options, e.g. workers for the parallel engine
+        self.options = options
         self.signals = Signals()
+        # progress reports are coalesced before they reach the GUI thread
+        self.progress_signals = ThrottledSignals(self.signals, progress_interval)
+        # cancel() stops the evaluation at the next chunk of frames or shot
+        self.cancellation = CancellationToken()
+        # per-stage timings and counters, forwarded to anyone connected to signals.instrumentation_event
+        self.instrumentation = Instrumentation(profile=profile)
+        self.instrumentation.subscribe(self.signals.instrumentation_event.emit)
+
+    def cancel(self: 'EvaluatorWorker'):
+        self.cancellation.cancel()
 
     @pyqtSlot()
     def run(self: 'EvaluatorWorker'):
-        start = datetime.datetime.now()
-        self.signals.report_progress.emit(('Detecting and segmenting shots...', 0))
-        evaluator = Evaluator(self.rgbFolder, self.wavFile, self.signals)
-        evaluator.evaluate()
-        frame_nums_to_write = evaluator.select_frames()
+        try:
+            # cancelled while waiting in the thread pool's queue
+            self.cancellation.check()
+            self.signals.started.emit()
+            start = datetime.datetime.now()
+            self.progress_signals.report_progress.emit(('Detecting and segmenting shots...', 0))
+            evaluator = create_evaluator(self.rgbFolder, self.wavFile, self.progress_signals, self.engine,
+                                         instrumentation=self.instrumentation, cancellation=self.cancellation,
+                                         **self.options)
+            evaluator.evaluate()
+            frame_nums_to_write = evaluator.select_frames()
+        except JobCancelled:
+            self.progress_signals.report_progress.flush()
+            self.signals.cancelled.emit()
+            return
+        except Exception as e:
+            self.progress_signals.report_progress.flush()
+            self.signals.failed.emit('{name}: {error}'.format(name=type(e).__name__, error=e))
+            return
+        # deliver the report held back last before the completion one
+        self.progress_signals.report_progress.flush()
         end = datetime.datetime.now()
 
         elapsed = end - start
@@ -33,6 +71,6 @@ class EvaluatorWorker(QRunnable):
         total_seconds = '{total_seconds:02d}'.format(total_seconds=int(total_seconds))
         total_minutes = '{total_minutes:02d}'.format(total_minutes=int(total_minutes))
 
-        self.signals.report_progress.emit(('Program ran for {total_minutes}:{total_seconds} (mm:ss)'.format(
+        self.progress_signals.report_progress.emit(('Program ran for {total_minutes}:{total_seconds} (mm:ss)'.format(
             total_minutes=total_minutes, total_seconds=total_seconds), 1))
-        self.signals.finished_with_results.emit((frame_nums_to_write, evaluator.audio))
+        self.signals.finished_with_results.emit((frame_nums_to_write, evaluator.audio, evaluator.metadata))
@@ -0,0 +1,122 @@
+import glob
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+
+from frame_store import FrameStore, write_atomically
+from shot import ShotTable
+
+# bump whenever the cached results would change for the same inputs and parameters
+CACHE_VERSION = 5
+
+
+class AnalysisCache:
+    """
+    On-disk cache of evaluation results.
+
+    Each entry holds the cutting list and the columns of the evaluated ShotTable (including the per-frame motion
+    scores) of one video in a single .npz file. Entries are keyed by a hash of the RGB folder, the WAV file and the
+    evaluator parameters, so changing any of them misses the cache. Least recently used entries are evicted once the
+    cache grows over max_size bytes.
+    """
+
+    def __init__(self, root='cache/', max_size=256 * 1024 * 1024, hash_contents=False):
+        # folder holding the cache entries
+        self.root = root
+        # maximum total size of the entries in bytes
+        self.max_size = max_size
+        # hash the bytes of every input file instead of their names, sizes and modification times
+        self.hash_contents = hash_contents
+        os.makedirs(self.root, exist_ok=True)
+
+    def get_key(self, rgb_folder, audio_path, params):
+        """
+        Returns the cache key of a video
+        :param rgb_folder: folder containing the .rgb frames
+        :param audio_path: path of the WAV file
+        :param params: JSON serializable evaluator parameters that affect the results
+        :return: hex digest
+        """
+        key = hashlib.blake2b(digest_size=16)
+        key.update(json.dumps([CACHE_VERSION, params], sort_keys=True).encode())
+        if self.hash_contents:
+            for filename in sorted(os.listdir(rgb_folder)):
+                self._hash_file(key, os.path.join(rgb_folder, filename))
+            self._hash_file(key, audio_path)
+        else:
+            audio_stat = os.stat(audio_path)
+            key.update(json.dumps([FrameStore.get_fingerprint(rgb_folder),
+                                   [audio_stat.st_size, audio_stat.st_mtime_ns]]).encode())
+        return key.hexdigest()
+
+    @staticmethod
+    def _hash_file(key, path):
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                key.update(chunk)
+
+    def get_path(self, key):
+        return os.path.join(self.root, key + '.npz')
+
+    def load(self, key):
+        """
+        :return: (cutting_list, shots) or None if the video is not cached
+        """
+        path = self.get_path(key)
+        try:
+            entry = np.load(path)
+        except FileNotFoundError:
+            return None
+        with entry:
+            cutting_list = entry['cutting_list'].tolist()
+            shots = ShotTable.from_arrays(entry['shots'], entry['motion'], entry['motion_offset'], entry['fps'].item())
+        # mark the entry as recently used
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return cutting_list, shots
+
+    def store(self, key, cutting_list, shots):
+        """
+        :param shots: evaluated ShotTable
+        """
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, cutting_list=np.array(cutting_list, dtype=np.int64), shots=shots.rows,
+                            motion=shots.motion, motion_offset=shots.motion_offset, fps=shots.fps)
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                f.write(buffer.getvalue())
+
+        # readers never see a partial entry, and jobs storing the same entry at once (e.g. the same video evaluated
+        # twice by the GUI) each write their own temporary file
+        write_atomically(self.get_path(key), write)
+        self.evict()
+
+    def evict(self):
+        # drop the least recently used entries until the cache fits in max_size
+        entries = []
+        for path in glob.glob(os.path.join(self.root, '*.npz')):
+            try:
+                entries.append((os.stat(path), path))
+            except FileNotFoundError:
+                # already evicted by another process sharing the cache
+                pass
+        entries.sort(key=lambda entry: entry[0].st_mtime_ns)
+        total_size = sum(stat.st_size for stat, path in entries)
+        for stat, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= stat.st_size
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.root, '*.npz')):
+            os.remove(path)
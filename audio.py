@@ -0,0 +1,120 @@
+import math
+import os
+import struct
+
+import numpy as np
+import wavio
+
+# audio samples per video frame of the project dataset (48000 Hz / 30 fps), see VideoMetadata.samples_per_frame
+SAMPLES_PER_FRAME = 1600
+# frames converted to floating point at once when computing energies, bounds the temporary memory
+ENERGY_CHUNK_FRAMES = 1024
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def read_wav(path):
+    """
+    Memory-maps the samples of a PCM WAV file instead of decoding all of them like wavio.read. 24 bit files cannot be
+    mapped and are read with wavio instead.
+    :return: wavio.Wav whose data is a (samples, channels) array, as returned by wavio.read
+    """
+    with open(path, 'rb') as f:
+        riff, size, wave = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave != b'WAVE':
+            raise ValueError('{path} is not a WAV file'.format(path=path))
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError('{path} has no data chunk'.format(path=path))
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                fmt = struct.unpack('<HHIIHH', f.read(16))
+                f.seek(chunk_size - 16 + chunk_size % 2, 1)
+            elif chunk_id == b'data':
+                data_offset = f.tell()
+                break
+            else:
+                # chunks are padded to an even size
+                f.seek(chunk_size + chunk_size % 2, 1)
+
+    if fmt is None:
+        raise ValueError('{path} has no fmt chunk'.format(path=path))
+    audio_format, channels, rate, byte_rate, block_align, bits = fmt
+    sampwidth = (bits + 7) // 8
+    if audio_format not in (WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE) or sampwidth == 3:
+        return wavio.read(path)
+    # same dtypes as wavio.read
+    dtype = {1: np.uint8, 2: np.dtype('<i2'), 4: np.dtype('<i4')}[sampwidth]
+    # the size in the header of a truncated or still growing file can be too big
+    samples = min(chunk_size, os.path.getsize(path) - data_offset) // (channels * sampwidth)
+    data = np.memmap(path, dtype=dtype, mode='r', offset=data_offset, shape=(samples, channels))
+    return wavio.Wav(data=data, rate=rate, sampwidth=sampwidth)
+
+
+class AudioEnergy:
+    """
+    Sum of the squared samples of every video frame, computed in a single pass over the track.
+
+    The cumulative sums give the RMS of any range of frames in constant time, so scoring every shot is O(shots)
+    instead of going over the samples of each shot again.
+    """
+
+    def __init__(self, samples, samples_per_frame=SAMPLES_PER_FRAME):
+        """
+        :param samples: (samples, channels) array, e.g. wavio.Wav.data
+        :param samples_per_frame: audio samples per video frame, e.g. VideoMetadata.samples_per_frame, does not have
+        to be a whole number
+        """
+        self.samples_per_frame = samples_per_frame
+        # unsigned 8 bit samples are centered on 128
+        offset = 128. if samples.dtype == np.uint8 else 0.
+        channels = samples.shape[1]
+        # first sample of every frame, and the end of the track
+        frames = int(math.ceil(len(samples) / float(samples_per_frame)))
+        boundaries = np.rint(np.arange(frames + 1) * float(samples_per_frame)).astype(np.int64)
+        while frames and boundaries[frames - 1] >= len(samples):
+            # rounding can leave the last frame without any sample
+            frames -= 1
+        boundaries = boundaries[:frames + 1]
+        boundaries[-1] = len(samples)
+        energies = np.empty(frames, dtype=np.float64)
+        counts = np.diff(boundaries) * channels
+
+        for start in range(0, frames, ENERGY_CHUNK_FRAMES):
+            end = min(start + ENERGY_CHUNK_FRAMES, frames)
+            chunk = samples[boundaries[start]:boundaries[end]].astype(np.float64)
+            if offset:
+                chunk -= offset
+            # energy of every sample, then of every frame of the chunk
+            energies[start:end] = np.add.reduceat(np.einsum('ij,ij->i', chunk, chunk),
+                                                  boundaries[start:end] - boundaries[start])
+
+        # cumulative_energies[n] is the energy of the frames before frame n
+        self.cumulative_energies = np.concatenate(([0.], np.cumsum(energies)))
+        self.cumulative_counts = np.concatenate(([0], np.cumsum(counts)))
+
+    def __len__(self):
+        return len(self.cumulative_counts) - 1
+
+    def get_frame_rms(self):
+        """
+        :return: (frames,) array of the RMS of every frame
+        """
+        return np.sqrt(np.diff(self.cumulative_energies) / np.diff(self.cumulative_counts))
+
+    def get_rms(self, start, end):
+        """
+        Returns the RMS of the samples of frames start to end (non-inclusive). Frames past the end of the track are
+        ignored, an empty range has an RMS of 0.
+        :param start: first frame number, or array of them
+        :param end: last frame number (non-inclusive), or array of them
+        :return: float, or array of floats if start and end are arrays
+        """
+        start = np.clip(start, 0, len(self))
+        end = np.clip(end, start, len(self))
+        energies = self.cumulative_energies[end] - self.cumulative_energies[start]
+        counts = self.cumulative_counts[end] - self.cumulative_counts[start]
+        return np.sqrt(energies / np.maximum(counts, 1))
@@ -0,0 +1,97 @@
+import io
+import wave
+
+import numpy as np
+
+from video_metadata import get_sample_index
+
+# ffmpeg sample formats of the supported audio sampling widths
+AUDIO_FORMATS = {1: 'u8', 2: 's16le', 3: 's24le', 4: 's32le'}
+
+
+def get_sample_ranges(selections, audio_rate, fps):
+    """
+    :param selections: (start, end) frame numbers of the selected clips, end non-inclusive
+    :return: (starts, ends) arrays of the audio sample indices of the clips
+    """
+    selections = np.asarray(selections, dtype=np.int64).reshape(-1, 2)
+    return get_sample_index(selections[:, 0], audio_rate, fps), get_sample_index(selections[:, 1], audio_rate, fps)
+
+
+def get_audio_views(samples, selections, audio_rate, fps):
+    """
+    :param samples: (samples, channels) array of the whole track, e.g. wavio.Wav.data, may be memory-mapped
+    :return: list of the views of the samples of every clip, nothing is copied. Clips past the end of the track are
+    cut short.
+    """
+    starts, ends = get_sample_ranges(selections, audio_rate, fps)
+    return [samples[start:end] for start, end in zip(starts, ends)]
+
+
+def assemble_audio(samples, selections, audio_rate, fps, out=None):
+    """
+    Splices the audio of the selected clips into a single track, with one copy of the selected samples. Any number of
+    channels and any sample type are supported, the track has the same ones as the samples.
+    :param samples: (samples, channels) array of the whole track
+    :param out: optional array to write the track to, e.g. a buffer reused from one summary to the next. It must have
+    at least as many rows as the track
+    :return: (samples, channels) array of the track
+    """
+    views = get_audio_views(samples, selections, audio_rate, fps)
+    total_samples = sum(len(view) for view in views)
+    if out is None:
+        out = np.empty((total_samples,) + samples.shape[1:], dtype=samples.dtype)
+    else:
+        out = out[:total_samples]
+    if views:
+        np.concatenate(views, out=out)
+    return out
+
+
+def get_pcm(samples, sampwidth):
+    """
+    :param samples: (samples, channels) array as returned by wavio.read, i.e. uint8 for 8 bit audio, int16 for 16 bit,
+    and int32 for 24 and 32 bit audio
+    :param sampwidth: bytes per sample
+    :return: flat uint8 array of the little-endian PCM bytes of the samples, a view of them whenever possible
+    """
+    if sampwidth == 3:
+        # 24 bit samples are in the 3 low bytes of the int32s
+        samples = np.ascontiguousarray(samples, dtype='<i4')
+        return samples.view(np.uint8).reshape(samples.shape + (4,))[..., :3].reshape(-1)
+    dtype = np.dtype(np.uint8) if sampwidth == 1 else np.dtype('<i{sampwidth}'.format(sampwidth=sampwidth))
+    return np.ascontiguousarray(samples, dtype=dtype).view(np.uint8).reshape(-1)
+
+
+def write_wav(file, samples, rate, sampwidth):
+    """
+    Writes samples to a WAV file, without the clipping and conversion passes of wavio.write
+    :param file: path or binary file object, e.g. io.BytesIO
+    """
+    channels = samples.shape[1] if samples.ndim > 1 else 1
+    with wave.open(file, 'wb') as f:
+        f.setnchannels(channels)
+        f.setsampwidth(sampwidth)
+        f.setframerate(rate)
+        f.writeframes(get_pcm(samples, sampwidth))
+
+
+def get_wav_buffer(samples, rate, sampwidth):
+    """
+    :return: io.BytesIO holding a WAV file of the samples, rewound. It can be loaded by pygame.mixer.music.load or
+    pygame.mixer.Sound, or piped to ffmpeg, without writing a file
+    """
+    buffer = io.BytesIO()
+    write_wav(buffer, samples, rate, sampwidth)
+    buffer.seek(0)
+    return buffer
+
+
+def write_pcm(f, views, sampwidth):
+    """
+    Writes the raw samples of audio views one after the other, e.g. to an ffmpeg pipe
+    :param f: binary file object
+    :param views: list of (samples, channels) arrays, see get_audio_views
+    """
+    for view in views:
+        f.write(get_pcm(view, sampwidth))
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from analysis_cache import AnalysisCache
+from audio import read_wav
+from engines import DEFAULT_ENGINE, ENGINES, create_evaluator
+from export import DEFAULT_EXPORT_MODE, EXPORT_MODES
+from faces import DEFAULT_FACE_BACKEND, FACE_BACKENDS
+from frame_store import remove_store
+from instrumentation import Instrumentation
+from video_converter import VideoConverter
+from video_metadata import DEFAULT_FPS, VideoMetadata
+
+
+def find_videos(dataset_root):
+    """
+    Discovers the RGB/JPG/WAV triple of every video in a dataset. Both layouts of the course data are supported:
+    project_dataset/{frames_rgb,frames}/<video>/ with project_dataset/audio/<video>.wav, and
+    test_data/{frames_rgb_test,frames_test}/<video>/ with test_data/<video>.wav.
+    :return: list of dictionaries with the keys name, rgb, jpg and wav
+    """
+    videos = []
+    for parent, folders, files in os.walk(dataset_root):
+        for rgb_root in sorted(folder for folder in folders if folder.startswith('frames_rgb')):
+            jpg_root = os.path.join(parent, rgb_root.replace('frames_rgb', 'frames', 1))
+            for name in sorted(os.listdir(os.path.join(parent, rgb_root))):
+                rgb = os.path.join(parent, rgb_root, name)
+                if not os.path.isdir(rgb):
+                    continue
+                wavs = [path for path in (os.path.join(parent, 'audio', name + '.wav'),
+                                          os.path.join(parent, name + '.wav')) if os.path.isfile(path)]
+                videos.append({
+                    'name': name,
+                    'rgb': rgb + '/',
+                    'jpg': os.path.join(jpg_root, name) + '/',
+                    'wav': wavs[0] if wavs else None,
+                })
+    return videos
+
+
+def summarize_video(video, output_root, engine, seconds, cache_root, profile_root=None,
+                    face_backend=DEFAULT_FACE_BACKEND, export_mode=DEFAULT_EXPORT_MODE, store_root=None,
+                    remove_stores=False, engine_options=None, probe_options=None):
+    """
+    Evaluates one video and writes its summary (frames/ and audio.wav) to output_root/<video name>
+    :param seconds: length of the summary, or list of lengths to write one summary of each length to
+    output_root/<video name>/<length>s from the same evaluation
+    :param profile_root: if set, a cProfile of every stage is written to profile_root/<video name>/<stage>.prof
+    :param export_mode: how the frames of the summaries are exported, see VideoConverter.offline_conversion
+    :param store_root: folder of the packed frame stores, see frame_store.default_store_path
+    :param remove_stores: delete the packed frame store of the video once it is summarized
+    :param engine_options: extra options of the evaluation engine, e.g. workers for the parallel engine
+    :param probe_options: fps, width and height of the frames, passed to VideoMetadata.probe
+    :return: dictionary describing the result, as stored in the manifest
+    """
+    result = dict(video, output=os.path.join(output_root, video['name']))
+    start = datetime.datetime.now()
+    instrumentation = Instrumentation(profile=profile_root is not None)
+    evaluator = None
+    try:
+        if video['wav'] is None or not os.path.isdir(video['jpg']):
+            raise FileNotFoundError('missing JPG folder or WAV file')
+        cache = AnalysisCache(cache_root) if cache_root is not None else None
+        metadata = VideoMetadata.probe(video['rgb'], read_wav(video['wav']), **(probe_options or {}))
+        evaluator = create_evaluator(video['rgb'], video['wav'], None, engine, cache=cache,
+                                     instrumentation=instrumentation, face_backend=face_backend, store_root=store_root,
+                                     metadata=metadata, **(engine_options or {}))
+        evaluator.evaluate()
+        lengths = seconds if isinstance(seconds, (list, tuple)) else [seconds]
+        summaries = evaluator.select_summaries(lengths)
+        result.update({'status': 'ok', 'shots': len(evaluator.shots)})
+        for length, frame_nums_to_write in summaries.items():
+            if isinstance(seconds, (list, tuple)):
+                summary = result.setdefault('summaries', {}).setdefault(str(length), {})
+                summary['output'] = os.path.join(result['output'], '{length}s'.format(length=length))
+            else:
+                summary = result
+            converter = VideoConverter(frame_nums_to_write, video['jpg'], evaluator.audio.data, evaluator.metadata.fps,
+                                       evaluator.audio.rate, evaluator.audio.sampwidth)
+            with instrumentation.stage('export'):
+                os.makedirs(os.path.dirname(summary['output']), exist_ok=True)
+                summary['export'] = converter.offline_conversion(summary['output'], export_mode)
+            summary.update({
+                'selections': [[int(start), int(end)] for start, end in frame_nums_to_write],
+                'summary_frames': int(sum(end - start for start, end in frame_nums_to_write)),
+            })
+    except Exception as e:
+        result.update({'status': 'failed', 'error': '{name}: {error}'.format(name=type(e).__name__, error=e)})
+    if remove_stores and evaluator is not None:
+        # release the memory map before deleting its file
+        evaluator.frames = None
+        remove_store(evaluator.store_path)
+    result['elapsed_seconds'] = (datetime.datetime.now() - start).total_seconds()
+    result['instrumentation'] = instrumentation.get_report()
+    if profile_root is not None:
+        instrumentation.dump_profiles(os.path.join(profile_root, video['name']))
+    return result
+
+
+def write_manifest(path, results):
+    # write to a temporary file first so that the manifest is never left half written
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarize every video of a dataset without the GUI.')
+    parser.add_argument('dataset_root', help='dataset folder, e.g. input/project_dataset')
+    parser.add_argument('-o', '--output', default='output_batch', help='folder receiving the summaries')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of videos summarized at once, defaults to the number of cores, or 1 with the '
+                             'parallel engine which already uses every core')
+    parser.add_argument('--engine', default=DEFAULT_ENGINE, choices=sorted(ENGINES), help='evaluation engine')
+    parser.add_argument('--face-backend', default=DEFAULT_FACE_BACKEND, choices=sorted(FACE_BACKENDS),
+                        help='face detection backend')
+    parser.add_argument('--seconds', type=int, nargs='+', default=[89],
+                        help='length of the summaries, several lengths write one summary of each length per video')
+    parser.add_argument('--export', default=DEFAULT_EXPORT_MODE, choices=EXPORT_MODES,
+                        help='export the frames as hard links, reflinks, copies or a manifest of frame ranges, auto '
+                             'picks the first of hardlink, reflink and copy that works')
+    parser.add_argument('--fps', type=float, default=None,
+                        help='frame rate of the videos, {fps} by default'.format(fps=DEFAULT_FPS))
+    parser.add_argument('--width', type=int, default=None,
+                        help='width of the frames, worked out from the size of the .rgb files (320x180 or 16:9) if not '
+                             'given')
+    parser.add_argument('--height', type=int, default=None,
+                        help='height of the frames, worked out from the size of the .rgb files if not given')
+    parser.add_argument('--cache', default='cache/', help='analysis cache folder')
+    parser.add_argument('--no-cache', action='store_true', help='always evaluate the videos from scratch')
+    parser.add_argument('--store-root', default=None,
+                        help='folder of the packed frame stores, next to the frame folders by default')
+    parser.add_argument('--remove-stores', action='store_true',
+                        help='delete the packed frame store of every video once it is summarized')
+    parser.add_argument('--profile', default=None, help='write a cProfile of every stage to this folder')
+    args = parser.parse_args(argv)
+
+    videos = find_videos(args.dataset_root)
+    if not videos:
+        print('No videos found in {root}'.format(root=args.dataset_root))
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+    manifest_path = os.path.join(args.output, 'manifest.json')
+    cache_root = None if args.no_cache else args.cache
+    probe_options = {'width': args.width, 'height': args.height}
+    if args.fps is not None:
+        # whole frame rates stay ints, so that the results are cached under the same keys as the GUI's
+        probe_options['fps'] = int(args.fps) if args.fps.is_integer() else args.fps
+    engine_options = {}
+    if args.engine == 'parallel':
+        # every video starts its own pool of worker processes, share the cores between the videos summarized at once
+        jobs = args.jobs if args.jobs is not None else 1
+        engine_options['workers'] = max(1, os.cpu_count() // jobs)
+    else:
+        jobs = args.jobs if args.jobs is not None else os.cpu_count()
+
+    results = []
+    # spawn fresh interpreters, forking after numba/scipy are loaded can deadlock
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+        seconds = args.seconds[0] if len(args.seconds) == 1 else args.seconds
+        futures = [executor.submit(summarize_video, video, args.output, args.engine, seconds, cache_root,
+                                   args.profile, args.face_backend, args.export, args.store_root, args.remove_stores,
+                                   engine_options, probe_options)
+                   for video in videos]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print('[{done}/{total}] {name}: {status} ({elapsed:.1f}s)'.format(
+                done=len(results), total=len(videos), name=result['name'], status=result['status'],
+                elapsed=result['elapsed_seconds']))
+            # keep the manifest up to date so that an interrupted run still reports the finished videos
+            write_manifest(manifest_path, sorted(results, key=lambda x: x['name']))
+
+    failed = [result for result in results if result['status'] != 'ok']
+    for result in failed:
+        print('{name} failed: {error}'.format(name=result['name'], error=result['error']))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
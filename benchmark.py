@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import wavio
+
+from frame_store import CHANNELS, FRAME_HEIGHT, FRAME_WIDTH
+
+FPS = 30
+AUDIO_RATE = 48000
+
+# modules imported at cold start by the GUI, batch mode and the parallel engine's worker processes, with the number of
+# seconds their import may take. Heavy libraries (face detectors, PySceneDetect, pygame...) load on first use instead.
+STARTUP_BUDGETS = OrderedDict([
+    ('main', 1.),
+    ('batch', 1.),
+    ('parallel_evaluator', 1.5),
+])
+STARTUP_RUNS = 3
+
+
+def generate_dataset(root, name='synthetic', frames=1800, shot_length=150, seed=0):
+    """
+    Writes a synthetic video in the project_dataset layout: root/frames_rgb/<name>/, root/frames/<name>/ and
+    root/audio/<name>.wav. Each shot has its own background, texture, moving objects and loudness, so that scene
+    detection, motion and audio scoring all have something to work with.
+    :param frames: number of frames of the video
+    :param shot_length: average shot length in frames, shots are between half and 1.5 times as long
+    :return: dictionary with the keys name, rgb, jpg, wav and cuts (the frame numbers where shots start)
+    """
+    rng = np.random.default_rng(seed)
+    rgb_folder = os.path.join(root, 'frames_rgb', name)
+    jpg_folder = os.path.join(root, 'frames', name)
+    wav_path = os.path.join(root, 'audio', name + '.wav')
+    for folder in (rgb_folder, jpg_folder, os.path.dirname(wav_path)):
+        os.makedirs(folder, exist_ok=True)
+
+    cuts = [0]
+    while cuts[-1] < frames:
+        cuts.append(cuts[-1] + int(rng.integers(shot_length // 2, shot_length * 3 // 2 + 1)))
+    cuts[-1] = frames
+
+    samples_per_frame = AUDIO_RATE // FPS
+    audio = np.empty((frames * samples_per_frame, 2), dtype=np.int16)
+    for start, end in zip(cuts[:-1], cuts[1:]):
+        background = rng.integers(0, 256, 3)
+        texture = rng.integers(-20, 21, (FRAME_HEIGHT, FRAME_WIDTH, 1))
+        objects = [(rng.integers(0, FRAME_HEIGHT - 40), rng.integers(0, FRAME_WIDTH - 40),
+                    rng.integers(-4, 5), rng.integers(-4, 5), rng.integers(0, 256, 3))
+                   for _ in range(rng.integers(0, 4))]
+        for frame_num in range(start, end):
+            t = frame_num - start
+            frame = np.clip(background + texture, 0, 255).astype(np.uint8)
+            for y, x, dy, dx, color in objects:
+                y = int(y + dy * t) % (FRAME_HEIGHT - 40)
+                x = int(x + dx * t) % (FRAME_WIDTH - 40)
+                frame[y:y + 40, x:x + 40] = color
+            # .rgb frames are planar, .jpg frames are written by OpenCV in BGR order
+            np.moveaxis(frame, -1, 0).tofile(os.path.join(rgb_folder, 'frame{num}.rgb'.format(num=frame_num)))
+            cv2.imwrite(os.path.join(jpg_folder, 'frame{num}.jpg'.format(num=frame_num)), frame[:, :, ::-1])
+
+        loudness = rng.uniform(500, 8000)
+        length = (end - start) * samples_per_frame
+        tone = np.sin(2 * np.pi * rng.uniform(100, 1000) * np.arange(length) / AUDIO_RATE)
+        noise = rng.standard_normal((length, 2)) * .1
+        shot_audio = (loudness * (tone[:, None] + noise)).astype(np.int16)
+        audio[start * samples_per_frame:end * samples_per_frame] = shot_audio
+    wavio.write(wav_path, audio, AUDIO_RATE, sampwidth=2)
+
+    return {'name': name, 'rgb': rgb_folder + '/', 'jpg': jpg_folder + '/', 'wav': wav_path, 'cuts': cuts}
+
+
+def get_peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on MacOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+class Stage:
+    """
+    Times a pipeline stage and records its throughput and the peak RSS of the process once it is done.
+    """
+
+    def __init__(self, results, name, frames):
+        self.results = results
+        self.name = name
+        self.frames = frames
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            return False
+        seconds = time.perf_counter() - self.start
+        self.results[self.name] = {
+            'seconds': seconds,
+            'frames': self.frames,
+            'frames_per_second': self.frames / seconds if seconds > 0 else None,
+            'peak_rss_mb': get_peak_rss_mb(),
+        }
+        return False
+
+
+def run_benchmark(video, workdir, motion_backend=None, face_backend=None):
+    """
+    Runs every stage of the pipeline on a video, one after the other
+    :param video: dictionary as returned by generate_dataset
+    :param workdir: working folder, converted videos are written to it
+    :return: OrderedDict of stage name to timings
+    """
+    from evaluator import Evaluator
+    from frame_store import FrameStore
+    from faces import DEFAULT_FACE_BACKEND
+    from motion import DEFAULT_MOTION_BACKEND
+    from video_converter import VideoConverter
+
+    motion_backend = DEFAULT_MOTION_BACKEND if motion_backend is None else motion_backend
+    face_backend = DEFAULT_FACE_BACKEND if face_backend is None else face_backend
+    results = OrderedDict()
+    frames = len(os.listdir(video['rgb']))
+
+    with Stage(results, 'pack_frames', frames):
+        FrameStore.pack(video['rgb'])
+    with Stage(results, 'detect_scenes', frames):
+        evaluator = Evaluator(video['rgb'], video['wav'], None, motion_backend, face_backend=face_backend)
+    with Stage(results, 'motion', frames):
+        for shot in evaluator.shots:
+            shot.motion_scores = evaluator.get_shot_motion_scores(evaluator.frames[shot.start:shot.end], motion_backend)
+            shot.motion_score = shot.get_motion_score()
+    with Stage(results, 'faces', frames):
+        for shot in evaluator.shots:
+            shot.face_detected = evaluator.detect_faces(evaluator.frames[shot.start:shot.end], face_backend)
+    with Stage(results, 'audio', frames):
+        audio_energy = evaluator.get_audio_energy()
+        for shot in evaluator.shots:
+            shot.audio_score = evaluator.get_shot_audio_score(shot, audio_energy)
+        evaluator.score_shots()
+    with Stage(results, 'select_frames', frames):
+        frame_nums_to_write = evaluator.select_frames()
+
+    summary_frames = int(sum(end - start for start, end in frame_nums_to_write))
+    converter = VideoConverter(frame_nums_to_write, video['jpg'], evaluator.audio.data, FPS, evaluator.audio.rate,
+                               evaluator.audio.sampwidth)
+    with Stage(results, 'construct_audio', summary_frames):
+        converter.construct_audio(os.path.join(workdir, 'audio.wav'))
+    with Stage(results, 'convert_video', summary_frames):
+        converter.convert_video(os.path.join(workdir, 'video.mp4'))
+    return results
+
+
+def measure_startup(budgets=STARTUP_BUDGETS, runs=STARTUP_RUNS):
+    """
+    Times the import of every module in a fresh interpreter, the best of several runs. Modules whose dependencies are
+    not installed (e.g. PyQt5 on a headless node) are left out.
+    :return: OrderedDict of module name to {'seconds', 'budget'}
+    """
+    script = 'import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)'
+    startup = OrderedDict()
+    for module, budget in budgets.items():
+        times = []
+        for _ in range(runs):
+            process = subprocess.run([sys.executable, '-c', script.format(module=module)], stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__)))
+            if process.returncode != 0:
+                break
+            times.append(float(process.stdout.decode().split()[-1]))
+        if times:
+            startup[module] = {'seconds': min(times), 'budget': budget}
+    return startup
+
+
+def compare(results, baseline, tolerance, min_seconds=.05):
+    """
+    Lists the stages that got slower than the baseline by more than the tolerance (e.g. 0.2 for 20%). Differences
+    under min_seconds are timing noise and are ignored.
+    :return: list of (stage, baseline seconds, seconds)
+    """
+    regressions = []
+    for name, stage in results.get('startup', {}).items():
+        before = baseline.get('startup', {}).get(name)
+        if before is not None and stage['seconds'] > before['seconds'] * (1 + tolerance) and \
+                stage['seconds'] - before['seconds'] > min_seconds:
+            regressions.append(('import ' + name, before['seconds'], stage['seconds']))
+    for name, stage in results['stages'].items():
+        if name not in baseline['stages'] or baseline['frames'] != results['frames']:
+            continue
+        before = baseline['stages'][name]['seconds']
+        if stage['seconds'] > before * (1 + tolerance) and stage['seconds'] - before > min_seconds:
+            regressions.append((name, before, stage['seconds']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every stage of the pipeline on a synthetic video.')
+    parser.add_argument('--frames', type=int, default=1800, help='length of the synthetic video in frames')
+    parser.add_argument('--shot-length', type=int, default=150, help='average shot length in frames')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic video')
+    parser.add_argument('--motion-backend', default=None, help='motion backend to benchmark')
+    parser.add_argument('--face-backend', default=None, help='face backend to benchmark')
+    parser.add_argument('--dataset', default=None, help='keep the synthetic dataset in this folder')
+    parser.add_argument('-o', '--output', default=None, help='write the results to this JSON file')
+    parser.add_argument('--compare', default=None, help='JSON results of a previous run to compare against')
+    parser.add_argument('--tolerance', type=float, default=.2, help='allowed slowdown before reporting a regression')
+    args = parser.parse_args(argv)
+
+    startup = measure_startup()
+    for module, stage in startup.items():
+        print('{name:>16}: {seconds:8.3f}s import, budget {budget:.1f}s{over}'.format(
+            name=module, seconds=stage['seconds'], budget=stage['budget'],
+            over=' (over budget)' if stage['seconds'] > stage['budget'] else ''))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        root = args.dataset if args.dataset is not None else os.path.join(workdir, 'dataset')
+        start = time.perf_counter()
+        video = generate_dataset(root, frames=args.frames, shot_length=args.shot_length, seed=args.seed)
+        print('Generated {frames} frames in {seconds:.1f}s'.format(frames=args.frames,
+                                                                   seconds=time.perf_counter() - start))
+        stages = run_benchmark(video, workdir, args.motion_backend, args.face_backend)
+
+    results = {
+        'frames': args.frames,
+        'shot_length': args.shot_length,
+        'seed': args.seed,
+        'frame_size': [FRAME_WIDTH, FRAME_HEIGHT, CHANNELS],
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'startup': startup,
+        'stages': stages,
+    }
+    for name, stage in stages.items():
+        print('{name:>16}: {seconds:8.3f}s {fps:>10} frames/s, peak RSS {rss:.0f} MB'.format(
+            name=name, seconds=stage['seconds'],
+            fps='-' if stage['frames_per_second'] is None else '{:.1f}'.format(stage['frames_per_second']),
+            rss=stage['peak_rss_mb']))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    regressions = []
+    if args.compare is not None:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, before, after in regressions:
+            print('Regression in {name}: {before:.3f}s -> {after:.3f}s'.format(name=name, before=before, after=after))
+    over_budget = [module for module, stage in startup.items() if stage['seconds'] > stage['budget']]
+    return 1 if regressions or over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
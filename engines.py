@@ -0,0 +1,29 @@
+import importlib
+
+# evaluation engines, selectable by name, as (module, class). The module is only imported once the engine is used, so
+# that the GUI and batch mode start without loading the analysis libraries (OpenCV, SciPy, face detectors...)
+ENGINES = {
+    # reads every frame first, then evaluates the shots one by one
+    'batch': ('evaluator', 'Evaluator'),
+    # evaluates each shot as soon as its cut is detected, in a single pass over the frames
+    'streaming': ('streaming_evaluator', 'StreamingEvaluator'),
+    # evaluates the shots concurrently in a pool of worker processes, options: workers
+    'parallel': ('parallel_evaluator', 'ParallelEvaluator'),
+}
+
+DEFAULT_ENGINE = 'batch'
+
+
+def get_engine(engine=DEFAULT_ENGINE):
+    """
+    :return: evaluator class of the engine
+    """
+    module, name = ENGINES[engine]
+    return getattr(importlib.import_module(module), name)
+
+
+def create_evaluator(frame_path, audio_path, signals, engine=DEFAULT_ENGINE, **options):
+    if engine not in ENGINES:
+        raise ValueError('Unknown evaluation engine {engine}, expected one of: {engines}'.format(
+            engine=engine, engines=', '.join(ENGINES)))
+    return get_engine(engine)(frame_path, audio_path, signals, **options)
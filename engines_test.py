@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from audio_assembly import write_wav
+from engines import ENGINES, create_evaluator
+
+WIDTH = 320
+HEIGHT = 180
+FRAME_COUNT = 120
+AUDIO_RATE = 48000
+FPS = 30
+
+
+def get_image(seed):
+    return np.random.RandomState(seed).randint(0, 256, (HEIGHT, WIDTH, 3)).astype(np.uint8)
+
+
+def write_video(folder):
+    """
+    Writes a video with a plain cut at frame 30 and a cut at frame 75 that only changes rows 1, 2 and 3 mod 4, which
+    a detection sampling every 4th row would miss
+    :return: (rgb folder, wav file)
+    """
+    off_grid = get_image(1).copy()
+    off_grid[np.arange(HEIGHT) % 4 != 0] = get_image(2)[np.arange(HEIGHT) % 4 != 0]
+    images = [(0, get_image(0)), (30, get_image(1)), (75, off_grid)]
+    rgb_folder = os.path.join(folder, 'rgb')
+    os.makedirs(rgb_folder)
+    for frame_num in range(FRAME_COUNT):
+        image = [image for start, image in images if start <= frame_num][-1]
+        # a moving block, so that the shots have some motion
+        image = image.copy()
+        x = frame_num * 3 % (WIDTH - 40)
+        image[60:100, x:x + 40] = 255 - image[60:100, x:x + 40]
+        np.moveaxis(image, -1, 0).tofile(os.path.join(rgb_folder, 'frame{num}.rgb'.format(num=frame_num)))
+    wav = os.path.join(folder, 'audio.wav')
+    samples = np.random.RandomState(3).randint(-3000, 3000, (FRAME_COUNT * AUDIO_RATE // FPS, 2)).astype(np.int16)
+    write_wav(wav, samples, AUDIO_RATE, 2)
+    return rgb_folder + '/', wav
+
+
+def test_engines_produce_the_same_shots():
+    folder = tempfile.mkdtemp()
+    try:
+        rgb_folder, wav = write_video(folder)
+        evaluators = {}
+        for engine in ENGINES:
+            evaluator = create_evaluator(rgb_folder, wav, None, engine)
+            evaluator.evaluate()
+            evaluators[engine] = evaluator
+        for engine, evaluator in evaluators.items():
+            assert evaluator.cutting_list == [30, 75], engine
+            assert np.array_equal(evaluator.shots.rows, evaluators['batch'].shots.rows), engine
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    test_engines_produce_the_same_shots()
@@ -1,169 +1,237 @@
 #!/usr/bin/env python3
 
-import os
-import re
-from collections import OrderedDict
-
-import face_recognition
-import imutils
 import numpy as np
-import wavio
-from blockmatching import *
-from scenedetect.detectors import ContentDetector
 
-from shot import Shot
-from video_converter import VideoConverter
+from audio import AudioEnergy, read_wav
+from faces import DEFAULT_FACE_BACKEND, detect_faces
+from frame_store import FrameStore, default_store_path
+from instrumentation import NULL_INSTRUMENTATION
+from jobs import CancellationToken
+from motion import DEFAULT_MOTION_BACKEND, get_blocks_per_pair, get_pair_scores
+from scene_detection import MIN_SCENE_LEN, SCENE_THRESHOLD, detect_cuts
+from scoring import ScoringConfig, ScoringEngine
+from shot import ShotTable
+from video_metadata import VideoMetadata
 
 
 class Evaluator:
-    def __init__(self, frame_path, audio_path, signals):
+    # number of processes detecting the scenes
+    scene_detection_workers = 1
+
+    def __init__(self, frame_path, audio_path, signals, motion_backend=DEFAULT_MOTION_BACKEND, cache=None,
+                 instrumentation=None, face_backend=DEFAULT_FACE_BACKEND, metadata=None, scoring_config=None,
+                 cancellation=None, detect_scenes=True, store_root=None):
+        """
+        :param store_root: folder receiving the packed frame file of the video, see frame_store.default_store_path
+        :param detect_scenes: detect the scenes and open the frames right away unless the results are cached, subclasses
+        reading the frames differently (see StreamingEvaluator) pass False
+        """
         self.rgb_folder = frame_path
-        self.audio = wavio.read(audio_path)
+        self.audio_path = audio_path
+        # samples are memory-mapped, not decoded
+        self.audio = read_wav(audio_path)
+        # length, resolution and frame rate of the video, read from its files unless given
+        self.metadata = metadata if metadata is not None else VideoMetadata.probe(frame_path, self.audio)
         self.frames = None
         self.cutting_list = None
         self.shots = None
         self.signals = signals
-        # detect scenes and read frames
-        self.detect_scenes()
-        # segregate shots
-        self.get_shots()
+        # name of the motion estimation backend, see motion.MOTION_BACKENDS
+        self.motion_backend = motion_backend
+        # name of the face detection backend, see faces.FACE_BACKENDS
+        self.face_backend = face_backend
+        # optional AnalysisCache, evaluated shots are restored from it instead of being computed again
+        self.cache = cache
+        # optional Instrumentation receiving the timings and counters of every stage
+        self.instrumentation = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
+        # weights and clip lengths turning the features of the shots into scores and summaries
+        self.scoring_config = scoring_config if scoring_config is not None else ScoringConfig()
+        # ScoringEngine of the evaluated shots, see get_scoring
+        self.scoring = None
+        # CancellationToken checked between chunks of frames and between shots, JobCancelled is raised once cancelled
+        self.cancellation = cancellation if cancellation is not None else CancellationToken()
+        # path of the packed frames of the video
+        self.store_path = default_store_path(frame_path, store_root)
+        self.cached = self.load_cache()
+        if not self.cached and detect_scenes:
+            # detect scenes and read frames
+            self.detect_scenes()
+            # segregate shots
+            self.get_shots()
+
+    def get_params(self):
+        # parameters that affect the evaluation results, used to invalidate cached results
+        return {'scene_threshold': SCENE_THRESHOLD, 'min_scene_len': MIN_SCENE_LEN,
+                'motion_backend': self.motion_backend, 'face_backend': self.face_backend,
+                'metadata': self.metadata.to_dict()}
+
+    def load_cache(self):
+        """
+        Restores the cutting list and evaluated shots from the cache
+        :return: True if the video was found in the cache
+        """
+        if self.cache is None:
+            return False
+        cached = self.cache.load(self.cache.get_key(self.rgb_folder, self.audio_path, self.get_params()))
+        if cached is None:
+            return False
+        self.cutting_list, self.shots = cached
+        return True
 
     def detect_scenes(self):
-        filenames = os.listdir(self.rgb_folder)
-        filenames.sort(key=lambda x: int(re.sub('\D', '', x)))
-        detector = ContentDetector(threshold=30.0, min_scene_len=7)
-        self.cutting_list = []
-        self.frames = []
-
-        frame_num = 0
-        for filename in filenames:
-            with open(self.rgb_folder + filename, 'rb') as f:
-                bytes = bytearray(f.read())
-            bytes = np.array(bytes)
-            frame_img = np.dstack([bytes[0:320 * 180], bytes[320 * 180: 320 * 180 * 2], bytes[320 * 180 * 2:]])
-            frame_img = frame_img.reshape(180, 320, 3)
-            self.frames.append(frame_img)
-            cuts = detector.process_frame(frame_num, frame_img)
-            self.cutting_list += cuts
-            frame_num += 1
-            if frame_num % 1000 == 0 and self.signals is not None:
-                self.signals.report_progress.emit((
-                    'Detecting and segmenting shots... {frame_num}/16200 frames evaluated.'.format(
-                        frame_num=frame_num), frame_num / 16200))
-        self.cutting_list += detector.post_process(frame_num)
-        self.frames = self.frames
+        with self.instrumentation.stage('open_frame_store'):
+            # pack the frames into a single memory-mapped file (only done once per folder)
+            self.frames = FrameStore.open(self.rgb_folder, self.store_path, self.metadata.width, self.metadata.height)
+        with self.instrumentation.stage('detect_scenes'):
+            # exactly the cuts of PySceneDetect's ContentDetector, the approximate detection is not used as it can
+            # miss some, see scene_detection.py
+            self.cutting_list = detect_cuts(self.frames, SCENE_THRESHOLD, MIN_SCENE_LEN,
+                                            workers=self.scene_detection_workers, progress=self.report_scene_progress)
+        self.instrumentation.count('frames_decoded', len(self.frames))
+        self.instrumentation.count('bytes_read', self.frames.planes.nbytes)
+
+    def report_scene_progress(self, frame_num):
+        self.cancellation.check()
+        if self.signals is not None:
+            self.signals.report_progress.emit((
+                'Detecting and segmenting shots... {frame_num}/{frame_count} frames evaluated.'.format(
+                    frame_num=frame_num, frame_count=self.metadata.frame_count),
+                frame_num / float(self.metadata.frame_count)))
 
     def get_shots(self):
-        shots = []
-        i = 0
-        s = 0
-        for frame in self.cutting_list:
-            shot = Shot(num=s, start=i, end=frame)
-            shots.append(shot)
-            s += 1
-            i = frame
-        if i < 16200:
-            shot = Shot(num=s, start=i, end=16200)
-            shots.append(shot)
-        self.shots = shots
+        self.shots = ShotTable.from_cuts(self.cutting_list, len(self.frames), self.metadata.fps)
 
     def evaluate(self):
-        # param for motion evaluation
-        alpha = .01
+        if not self.cached:
+            with self.instrumentation.stage('evaluate'):
+                self.evaluate_shots()
+                with self.instrumentation.stage('score_shots'):
+                    self.score_shots()
+            if self.cache is not None:
+                self.cache.store(self.cache.get_key(self.rgb_folder, self.audio_path, self.get_params()),
+                                 self.cutting_list, self.shots)
+        else:
+            # the cache holds the features, score them with the current configuration
+            self.get_scoring().get_shot_scores(self.scoring_config)
+        if self.signals is not None:
+            self.signals.report_progress.emit((
+                'Evaluating shots and calculating scores... {shot_num}/{shots} shots evaluated.'.format(
+                    shot_num=len(self.shots), shots=len(self.shots)), 1))
 
+    def evaluate_shots(self):
         # param for audio evaluation
-        samples = self.audio.data
+        audio_energy = self.get_audio_energy()
 
         for shot in self.shots:
-            # get frames corresponding to the current shot
-            shot_frames = np.array(self.frames[shot.start: shot.end])
-            # evaluate motion
-            first_frame = True
-            background = None
-            old_frame = None
-            motion_scores = {}
-            for idx, frame in enumerate(shot_frames):
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                frame = imutils.resize(frame, width=160, height=90)
-                if first_frame:
-                    background = BackgroundSubtractor(alpha, frame)
-                    foreground = background.foreground(frame)
-                    old_frame = foreground.copy()
-                    first_frame = False
-                else:
-                    foreground = background.foreground(frame)
-                    XP, YP, XD, YD = block_matching(old_frame, foreground, 4, 4)
-                    U, V, object_tops, meand = clustering(XD, YD, XP, YP)
-                    old_frame = foreground.copy()
-                    if meand:
-                        motion_scores[
-                            str(shot.start + idx - 1) + '_' + str(
-                                shot.start + idx)] = self.get_motion_score_of_two_frames(
-                            np.array(meand))
-                    else:
-                        motion_scores[str(shot.start + idx - 1) + '_' + str(shot.start + idx)] = 0.
-            shot.motion_scores = motion_scores
-            shot.motion_score = shot.get_motion_score()
-
-            # evaluate audio
-            shot_audio_samples = samples[shot.start * 1600:shot.end * 1600]
-            shot.audio_score = np.average(shot_audio_samples)
-
-            # evaluate faces
-            subsampled_frames = shot_frames[
-                np.random.choice(shot_frames.shape[0], int(shot_frames.shape[0] * .2), replace=False)]
-            for frame in subsampled_frames:
-                faces = face_recognition.face_locations(frame)
-                if faces:
-                    shot.face_detected = True
-                    break
+            self.cancellation.check()
+            # get frames corresponding to the current shot (a view into the frame store, nothing is copied)
+            shot_frames = self.frames[shot.start: shot.end]
+            self.evaluate_shot(shot, shot_frames, audio_energy)
             if shot.num % 10 == 0 and self.signals is not None:
                 self.signals.report_progress.emit((
                     'Evaluating shots and calculating scores... {shot_num}/{shots} shots evaluated.'.format(
                         shot_num=shot.num, shots=len(self.shots)), shot.num / len(self.shots)))
 
+    def get_audio_energy(self):
+        # per-frame energy of the entire track, computed in a single pass
+        with self.instrumentation.stage('audio'):
+            return AudioEnergy(self.audio.data, self.metadata.samples_per_frame)
+
+    def evaluate_shot(self, shot, shot_frames, audio_energy):
+        """
+        Computes the raw motion, audio and face features of a single shot
+        :param shot: Shot to evaluate
+        :param shot_frames: frames of the shot, shot_frames[0] being frame number shot.start
+        :param audio_energy: AudioEnergy of the entire video
+        """
+        # evaluate motion
+        with self.instrumentation.stage('motion'):
+            motion_scores = self.get_shot_motion_scores(shot_frames, self.motion_backend)
+            shot.motion_scores = motion_scores
+            shot.motion_score = shot.get_motion_score()
+        self.instrumentation.count('blocks_matched', len(motion_scores) * get_blocks_per_pair(*shot_frames.shape[1:3]))
+
+        # evaluate audio
+        with self.instrumentation.stage('audio'):
+            shot.audio_score = self.get_shot_audio_score(shot, audio_energy)
+
+        # evaluate faces
+        with self.instrumentation.stage('faces'):
+            shot.face_detected = self.detect_faces(shot_frames, self.face_backend, self.instrumentation)
+
+    def score_shots(self):
         # normalize scores
-        audio_scores = np.array([shot.audio_score for shot in self.shots])
+        audio_scores = self.shots.rows['audio_score']
         norm_audio_scores = audio_scores / np.linalg.norm(audio_scores)
-        avg_audio_score = np.average(norm_audio_scores)
 
-        for shot in self.shots:
-            shot.audio_score = norm_audio_scores[shot.num]
-            shot.get_shot_score(avg_audio_score)
-        if self.signals is not None:
-            self.signals.report_progress.emit((
-                'Evaluating shots and calculating scores... {shot_num}/{shots} shots evaluated.'.format(
-                    shot_num=len(self.shots), shots=len(self.shots)), 1))
-
-    def get_motion_score_of_two_frames(self, meand):
-        return sum(np.sqrt(np.square(meand[:, 0]) + np.square(meand[:, 1]))) / meand.shape[0]
-
-    def select_frames(self):
-        scores = [shot.shot_score for shot in self.shots]
-        shot_nums = [i for i in range(0, len(self.shots))]
-        shot_scores = dict(zip(shot_nums, scores))
-        sorted_shot_scores = OrderedDict(sorted(shot_scores.items(), key=lambda item: item[1], reverse=True))
-        fps = 30
-        # min of 89 seconds
-        seconds = 89
-        min_frames = fps * seconds
-        num_selected_frames = 0
-        frame_nums_to_write = []
-        frames = []
-        for k, v in sorted_shot_scores.items():
-            shot = self.shots[k]
-            start, end = shot.get_frames_with_highest_score()
-            if start is not None:
-                frame_nums_to_write.append((start, end))
-                num_selected_frames += (end - start)
-                frames.append(end - start)
-            if num_selected_frames >= min_frames:
-                break
-        frame_nums_to_write.sort(key=lambda x: x[0])
-        return frame_nums_to_write
+        self.shots.rows['audio_score'] = norm_audio_scores
+        self.get_scoring().get_shot_scores(self.scoring_config)
+
+    def get_scoring(self):
+        """
+        :return: ScoringEngine of the evaluated shots, rescoring them for other configurations reuses their features
+        """
+        if self.scoring is None or self.scoring.shots is not self.shots:
+            self.scoring = ScoringEngine(self.shots, self.instrumentation)
+        return self.scoring
+
+    def set_scoring_config(self, scoring_config):
+        """
+        Rescores the evaluated shots with another configuration, only the stages it affects are recomputed
+        """
+        self.scoring_config = scoring_config
+        self.get_scoring().get_shot_scores(scoring_config)
+
+    @staticmethod
+    def get_shot_audio_score(shot, audio_energy):
+        """
+        :param audio_energy: AudioEnergy of the entire video
+        :return: RMS of the audio samples of the shot
+        """
+        return float(audio_energy.get_rms(shot.start, shot.end))
+
+    @staticmethod
+    def get_shot_motion_scores(shot_frames, motion_backend=DEFAULT_MOTION_BACKEND):
+        """
+        Returns the motion scores between consecutive frames of a shot
+        :param shot_frames: frames of the shot
+        :param motion_backend: name of the motion estimation backend, see motion.MOTION_BACKENDS
+        :return: float32 array, the i-th score being between shot_frames[i] and shot_frames[i + 1]
+        """
+        return np.asarray(get_pair_scores(shot_frames, motion_backend), dtype=np.float32)
+
+    @staticmethod
+    def detect_faces(shot_frames, face_backend=DEFAULT_FACE_BACKEND, instrumentation=NULL_INSTRUMENTATION):
+        """
+        Looks for faces in up to 20% of the frames of a shot, evenly spaced
+        :param face_backend: name of the face detection backend, see faces.FACE_BACKENDS
+        :return: True if a face was found
+        """
+        face_detected, frames_searched = detect_faces(shot_frames, face_backend)
+        instrumentation.count('face_detector_invocations', frames_searched)
+        return face_detected
+
+    def select_frames(self, seconds=None):
+        """
+        Selects the frames of a summary of the given length, the configuration's summary length (89 s) by default
+        :return: list of (start, end) frame numbers, sorted
+        """
+        seconds = self.scoring_config.summary_seconds if seconds is None else seconds
+        return self.select_summaries([seconds])[seconds]
+
+    def select_summaries(self, seconds=(30, 60, 89)):
+        """
+        Selects the frames of several summaries at once, e.g. 30, 60 and 89 seconds long, see ScoringEngine.select
+        :param seconds: lengths of the summaries in seconds
+        :return: dictionary of length to the list of (start, end) frame numbers of the summary, sorted
+        """
+        with self.instrumentation.stage('select_frames'):
+            return self.get_scoring().select(seconds, self.scoring_config)
 
 
 if __name__ == "__main__":
+    from video_converter import VideoConverter
+
     folder = 'test_data_3'
     video_name = 'test_video_3'
     frames_rgb_folder = 'input/test_dataset/{folder}/frames_rgb_test/{video_name}/'.format(folder=folder,
@@ -177,6 +245,6 @@ if __name__ == "__main__":
     frame_nums_to_write = evaluator.select_frames()
 
     # offline run
-    converter = VideoConverter(frame_nums_to_write, frames_jpg_folder, evaluator.audio.data, 30, evaluator.audio.rate,
-                               evaluator.audio.sampwidth)
+    converter = VideoConverter(frame_nums_to_write, frames_jpg_folder, evaluator.audio.data, evaluator.metadata.fps,
+                               evaluator.audio.rate, evaluator.audio.sampwidth)
     converter.offline_conversion('./output_offline/{video_name}'.format(video_name=video_name))
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# ioctl cloning a file on copy-on-write filesystems (Btrfs, XFS, bcachefs...), see ioctl_ficlone(2)
+FICLONE = 0x40049409
+# threads copying frames when they can be neither linked nor cloned
+COPY_THREADS = 8
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+FRAME_NAME = 'frame{num}.jpg'
+
+
+def link_frame(source, destination):
+    # hard link, the frame is shared with the source folder, so it must not be modified in place
+    os.link(source, destination)
+
+
+def reflink_frame(source, destination):
+    # copy-on-write clone, shares the data blocks of the source until either file is modified
+    import fcntl
+
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(destination)
+            raise
+
+
+def copy_frame(source, destination):
+    shutil.copyfile(source, destination)
+
+
+# ways of exporting the frames of a summary, from the cheapest. Linking and cloning are metadata operations, but only
+# work within a filesystem (and cloning only on some of them)
+FRAME_EXPORTERS = OrderedDict([
+    ('hardlink', link_frame),
+    ('reflink', reflink_frame),
+    ('copy', copy_frame),
+])
+# auto: the first of FRAME_EXPORTERS that works, manifest: no frames at all, see write_manifest
+EXPORT_MODES = ('auto', 'manifest') + tuple(FRAME_EXPORTERS)
+DEFAULT_EXPORT_MODE = 'auto'
+
+
+def get_frame_names(selections):
+    """
+    :param selections: (start, end) frame numbers, end non-inclusive
+    :return: list of the file names of the selected frames, in order
+    """
+    return [FRAME_NAME.format(num=num) for start, end in selections for num in range(start, end)]
+
+
+def export_frames(names, source_folder, folder, mode=DEFAULT_EXPORT_MODE, threads=COPY_THREADS):
+    """
+    Exports frames from one folder to another
+    :param names: file names of the frames
+    :param mode: one of FRAME_EXPORTERS, or auto to use the first of them that works for these folders
+    :return: name of the exporter used
+    """
+    if mode not in FRAME_EXPORTERS and mode != 'auto':
+        raise ValueError('Unknown export mode {mode}, expected one of: {modes}'.format(
+            mode=mode, modes=', '.join(EXPORT_MODES)))
+    if not names:
+        return mode
+    candidates = list(FRAME_EXPORTERS) if mode == 'auto' else [mode]
+    # find out with the first frame which exporter works
+    for exporter in candidates:
+        try:
+            FRAME_EXPORTERS[exporter](os.path.join(source_folder, names[0]), os.path.join(folder, names[0]))
+            break
+        except OSError:
+            if exporter == candidates[-1]:
+                raise
+
+    pairs = [(os.path.join(source_folder, name), os.path.join(folder, name)) for name in names[1:]]
+    if exporter == 'copy':
+        # copies are bound by I/O latency, several of them at once keep the disks busy
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(lambda pair: copy_frame(*pair), pairs))
+    else:
+        for source, destination in pairs:
+            FRAME_EXPORTERS[exporter](source, destination)
+    return exporter
+
+
+def write_manifest(folder, source_folder, selections, fps):
+    """
+    Writes the manifest of a summary: the frame ranges it is made of and the folder holding the frames, instead of the
+    frames themselves. VideoPlayer plays the folder like a folder of frames, as long as the source folder exists.
+    """
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'source': os.path.abspath(source_folder),
+        'selections': [[int(start), int(end)] for start, end in selections],
+        'fps': fps,
+    }
+    with open(os.path.join(folder, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_manifest(folder):
+    """
+    :return: the manifest of the folder as written by write_manifest, or None if it has none
+    """
+    path = os.path.join(folder, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError('{path} has an unsupported manifest version'.format(path=path))
+    return manifest
@@ -0,0 +1,218 @@
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# at most this fraction of the frames of a shot is searched for faces
+SAMPLE_FRACTION = .2
+# frames wider than this are downscaled to it before looking for faces, so the cost stops growing with the resolution
+DETECTION_WIDTH = 640
+# folder holding the model files of the cascade and dnn backends
+MODEL_FOLDER = 'models/'
+
+# face detector instances of the current process, keyed by backend name, models are only loaded once
+_backends = {}
+
+
+def get_sample_indices(frame_count, fraction=SAMPLE_FRACTION):
+    """
+    Picks evenly spaced frames of a shot, ordered coarse to fine: the first frame, then the middle one, then the
+    quarters and so on. Stopping at the first face found therefore only looks at a few frames wherever the face shows
+    up in the shot, and the same shot always samples the same frames.
+    :param frame_count: number of frames of the shot
+    :param fraction: fraction of the frames to sample
+    :return: array of frame indices
+    """
+    count = int(frame_count * fraction)
+    if count == 0:
+        return np.empty(0, dtype=np.int64)
+    # centre of each of count equally long segments of the shot
+    positions = np.arange(count)
+    indices = ((positions + .5) * frame_count / count).astype(np.int64)
+    # the lowest set bit of a position is its level in the coarse to fine order, 0 being the coarsest
+    levels = np.where(positions == 0, 1 << int(count).bit_length(), positions & -positions)
+    return indices[np.lexsort((positions, -levels))]
+
+
+def resize_frames(frames, scale):
+    """
+    Downscales a batch of frames, returns them unchanged if scale is 1
+    :param frames: (N, height, width, 3) frames
+    :return: list of contiguous frames
+    """
+    if scale == 1.:
+        return [np.ascontiguousarray(frame) for frame in frames]
+    return [cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) for frame in frames]
+
+
+class HogFaceBackend:
+    """
+    Reference backend using face_recognition's HOG detector (dlib), one frame at a time.
+    """
+    name = 'hog'
+    batch_size = 1
+
+    def __init__(self, scale=1., upsample=1):
+        # faces are small in 320x180 frames, HOG misses them when the frames are downscaled
+        self.scale = scale
+        # times the frames are upsampled by dlib to find smaller faces
+        self.upsample = upsample
+
+    def find_faces(self, frames):
+        import face_recognition
+
+        for frame in resize_frames(frames, self.scale):
+            if face_recognition.face_locations(frame, number_of_times_to_upsample=self.upsample):
+                return True
+        return False
+
+
+class CascadeFaceBackend:
+    """
+    OpenCV cascade classifier, an order of magnitude faster than HOG but with more false negatives on profile faces.
+    """
+    name = 'haar'
+    batch_size = 1
+
+    def __init__(self, cascade_path=None, scale=1., min_size=20):
+        if not hasattr(cv2, 'CascadeClassifier'):
+            raise ImportError('This OpenCV build does not include the objdetect module')
+        if cascade_path is None:
+            cascade_path = os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+        self.classifier = cv2.CascadeClassifier(cascade_path)
+        if self.classifier.empty():
+            raise FileNotFoundError('Could not load the face cascade {path}'.format(path=cascade_path))
+        self.scale = scale
+        # smallest face searched for, in pixels of the full size frame
+        self.min_size = max(int(min_size * scale), 8)
+
+    def find_faces(self, frames):
+        for frame in resize_frames(frames, self.scale):
+            gray = cv2.equalizeHist(cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY))
+            faces = self.classifier.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5,
+                                                     minSize=(self.min_size, self.min_size))
+            if len(faces):
+                return True
+        return False
+
+
+class LbpFaceBackend(CascadeFaceBackend):
+    """
+    LBP cascade, faster again than the Haar one. OpenCV's pip packages do not ship it, place
+    lbpcascade_frontalface_improved.xml in the models folder.
+    """
+    name = 'lbp'
+
+    def __init__(self, cascade_path=None, scale=1., min_size=20):
+        if cascade_path is None:
+            cascade_path = os.path.join(MODEL_FOLDER, 'lbpcascade_frontalface_improved.xml')
+        super(LbpFaceBackend, self).__init__(cascade_path, scale, min_size)
+
+
+class DnnFaceBackend:
+    """
+    OpenCV's ResNet-10 SSD face detector run through cv2.dnn, a whole batch of frames per forward pass. Needs
+    deploy.prototxt and res10_300x300_ssd_iter_140000.caffemodel in the models folder.
+    """
+    name = 'dnn'
+    batch_size = 16
+
+    def __init__(self, model_folder=MODEL_FOLDER, input_size=(300, 300), confidence=.5):
+        config_path = os.path.join(model_folder, 'deploy.prototxt')
+        model_path = os.path.join(model_folder, 'res10_300x300_ssd_iter_140000.caffemodel')
+        for path in (config_path, model_path):
+            if not os.path.isfile(path):
+                raise FileNotFoundError('Could not find the face detection model {path}'.format(path=path))
+        self.net = cv2.dnn.readNetFromCaffe(config_path, model_path)
+        # (width, height) the frames are resized to before detection
+        self.input_size = input_size
+        # minimum confidence of a detection to count as a face
+        self.confidence = confidence
+
+    def find_faces(self, frames):
+        # the model expects BGR input, the frames are RGB
+        blob = cv2.dnn.blobFromImages([np.ascontiguousarray(frame) for frame in frames], 1., self.input_size,
+                                      (104., 177., 123.), swapRB=True)
+        self.net.setInput(blob)
+        # (1, 1, detections, 7) with the confidence of each detection in column 2
+        detections = self.net.forward()
+        return bool(np.any(detections[0, 0, :, 2] > self.confidence))
+
+
+FACE_BACKENDS = {
+    HogFaceBackend.name: HogFaceBackend,
+    CascadeFaceBackend.name: CascadeFaceBackend,
+    LbpFaceBackend.name: LbpFaceBackend,
+    DnnFaceBackend.name: DnnFaceBackend,
+}
+
+DEFAULT_FACE_BACKEND = HogFaceBackend.name
+
+
+def get_face_backend(name=DEFAULT_FACE_BACKEND):
+    if name not in FACE_BACKENDS:
+        raise ValueError('Unknown face backend {name}, expected one of: {backends}'.format(
+            name=name, backends=', '.join(FACE_BACKENDS)))
+    if name not in _backends:
+        _backends[name] = FACE_BACKENDS[name]()
+    return _backends[name]
+
+
+def detect_faces(shot_frames, backend=DEFAULT_FACE_BACKEND, fraction=SAMPLE_FRACTION):
+    """
+    Looks for faces in evenly spaced frames of a shot, stopping at the first batch containing one
+    :param shot_frames: frames of the shot, (N, height, width, 3)
+    :param backend: name of the face backend
+    :param fraction: at most this fraction of the frames is searched
+    :return: (True if a face was found, number of frames searched)
+    """
+    face_backend = get_face_backend(backend)
+    indices = get_sample_indices(len(shot_frames), fraction)
+    scale = min(DETECTION_WIDTH / float(shot_frames.shape[2]), 1.) if len(shot_frames) else 1.
+    for offset in range(0, len(indices), face_backend.batch_size):
+        batch = indices[offset:offset + face_backend.batch_size]
+        frames = shot_frames[batch]
+        if scale < 1.:
+            frames = resize_frames(frames, scale)
+        if face_backend.find_faces(frames):
+            return True, offset + len(batch)
+    return False, len(indices)
+
+
+def benchmark_backends(shots_frames, backends=None):
+    """
+    Runs every available face backend on the same shots to compare their results and speed
+    :param shots_frames: list of the frames of each shot
+    :return: dictionary in this format: {'haar': {'shots_with_faces': 3, 'shots_per_second': 20.0}, ...}
+    """
+    results = {}
+    for name in FACE_BACKENDS if backends is None else backends:
+        try:
+            get_face_backend(name)
+        except (ImportError, FileNotFoundError) as e:
+            print('Skipping {name}: {error}'.format(name=name, error=e))
+            continue
+        start = time.perf_counter()
+        found = [detect_faces(shot_frames, name) for shot_frames in shots_frames]
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            'shots_with_faces': sum(face_detected for face_detected, searched in found),
+            'frames_searched': sum(searched for face_detected, searched in found),
+            'shots_per_second': len(shots_frames) / elapsed if elapsed > 0 else float('inf'),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    # A/B the face backends on consecutive 150 frame chunks: ./faces.py <rgb folder> [start] [end]
+    from frame_store import FrameStore
+
+    store = FrameStore.open(sys.argv[1])
+    start = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    end = int(sys.argv[3]) if len(sys.argv) > 3 else len(store)
+    chunks = [store[chunk_start:min(chunk_start + 150, end)] for chunk_start in range(start, end, 150)]
+    for name, result in benchmark_backends(chunks).items():
+        print('{name:>6}: faces in {shots_with_faces}/{shots} shots, {frames_searched} frames searched, '
+              '{shots_per_second:.1f} shots/s'.format(name=name, shots=len(chunks), **result))
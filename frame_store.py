@@ -0,0 +1,240 @@
+import contextlib
+import hashlib
+import json
+import os
+import re
+import tempfile
+import uuid
+
+import numpy as np
+
+# dimensions of the planar .rgb frames in the project dataset
+FRAME_WIDTH = 320
+FRAME_HEIGHT = 180
+CHANNELS = 3
+# folder receiving the packed frame files, e.g. a local scratch disk when the dataset is read-only. If not set, every
+# packed file is written next to the folder it was built from
+STORE_ROOT = os.environ.get('FRAME_STORE_ROOT')
+# bytes of the random id appended to a packed file, the same id is in its header so that a file and a header written by
+# different packs are never paired
+PACK_ID_SIZE = 16
+
+
+def list_frame_files(folder):
+    """
+    Returns the frame file names in a folder, ordered by their frame number
+    :param folder: folder containing frame files such as frame0.rgb, frame1.rgb...
+    :return: list of file names
+    """
+    filenames = os.listdir(folder)
+    filenames.sort(key=lambda x: int(re.sub(r'\D', '', x)))
+    return filenames
+
+
+def iter_frames(rgb_folder, width=FRAME_WIDTH, height=FRAME_HEIGHT):
+    """
+    Reads the frames of a folder one at a time, without packing them into a store
+    :return: generator of interleaved (height, width, 3) frames
+    """
+    for filename in list_frame_files(rgb_folder):
+        planes = np.fromfile(os.path.join(rgb_folder, filename), dtype=np.uint8).reshape(CHANNELS, height, width)
+        yield np.moveaxis(planes, 0, -1)
+
+
+def default_store_path(rgb_folder, root=None):
+    """
+    :param root: folder of the packed files, STORE_ROOT by default
+    :return: path of the packed file of a frame folder: next to the folder, e.g. .../frames_rgb/concert.frames, or in
+    the root under the folder's name and a hash of its path, e.g. <root>/concert-1b2c3d4e5f60.frames
+    """
+    root = root if root is not None else STORE_ROOT
+    if root is None:
+        return os.path.normpath(rgb_folder) + '.frames'
+    folder = os.path.abspath(rgb_folder)
+    return os.path.join(root, '{name}-{digest}.frames'.format(
+        name=os.path.basename(folder), digest=hashlib.sha1(folder.encode()).hexdigest()[:12]))
+
+
+def remove_store(path):
+    """
+    Deletes a packed frame file along with its header and lock file. Stores are only a cache of their frame folder,
+    they are packed again when needed
+    """
+    for file_path in (path, path + '.json', path + '.lock'):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+class StaleFrameStore(ValueError):
+    """
+    Raised when a packed file and its header do not belong together, e.g. while another process replaces them
+    """
+
+
+@contextlib.contextmanager
+def pack_lock(path):
+    """
+    Holds an exclusive lock on a store while it is packed, so that concurrent jobs do not pack the same folder twice
+    """
+    try:
+        import fcntl
+    except ImportError:
+        # no locking on Windows, concurrent packs still never corrupt the store, they only repeat the work
+        yield
+        return
+    with open(path + '.lock', 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def write_atomically(path, write):
+    """
+    Writes a file under a unique temporary name in its folder, then renames it, so that readers never see it half
+    written and concurrent writers do not write to the same file
+    :param write: function writing the content to the temporary path
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp',
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    try:
+        # mkstemp creates files only their owner can read
+        os.chmod(tmp_path, 0o644)
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class FrameStore:
+    """
+    Contiguous, memory-mapped store of planar RGB frames.
+
+    A folder of raw .rgb files is packed once into a single file laid out as (N, 3, height, width). The file is then
+    mapped read-only with np.memmap, so single frames and whole shots are views into the page cache rather than copies.
+    """
+
+    def __init__(self, path):
+        with open(path + '.json') as f:
+            meta = json.load(f)
+        # path of the packed frame file
+        self.path = path
+        # source folder and its fingerprint at the time the store was packed
+        self.source = meta['source']
+        self.fingerprint = meta['fingerprint']
+        self.frame_count = meta['frame_count']
+        self.height = meta['height']
+        self.width = meta['width']
+        frames_size = self.frame_count * CHANNELS * self.height * self.width
+        with open(path, 'rb') as f:
+            f.seek(frames_size)
+            if f.read(PACK_ID_SIZE).hex() != meta.get('pack_id'):
+                raise StaleFrameStore('{path} does not match its header'.format(path=path))
+        # planar view of all frames: (N, 3, height, width)
+        self.planes = np.memmap(path, dtype=np.uint8, mode='r',
+                                shape=(self.frame_count, CHANNELS, self.height, self.width))
+        # interleaved view of all frames: (N, height, width, 3), no data is copied
+        self.frames = np.moveaxis(self.planes, 1, -1)
+
+    def __len__(self):
+        return self.frame_count
+
+    def __getitem__(self, index):
+        """
+        Returns interleaved (height, width, 3) views of the requested frame(s), in the same channel order as the .rgb
+        files. Slicing a shot, e.g. store[shot.start:shot.end], does not copy any pixel data.
+        """
+        return self.frames[index]
+
+    @staticmethod
+    def get_fingerprint(rgb_folder, filenames=None):
+        """
+        Cheap fingerprint of a frame folder based on its file listing, sizes and modification times
+        :return: [number of files, total size in bytes, latest modification time in ns]
+        """
+        if filenames is None:
+            filenames = list_frame_files(rgb_folder)
+        total_size = 0
+        latest_mtime = 0
+        for filename in filenames:
+            stat = os.stat(os.path.join(rgb_folder, filename))
+            total_size += stat.st_size
+            latest_mtime = max(latest_mtime, stat.st_mtime_ns)
+        return [len(filenames), total_size, latest_mtime]
+
+    @classmethod
+    def pack(cls, rgb_folder, path=None, width=FRAME_WIDTH, height=FRAME_HEIGHT):
+        """
+        Packs every .rgb frame of a folder into a single contiguous planar file and opens it
+        :param rgb_folder: folder containing the .rgb frames
+        :param path: destination of the packed file, defaults to a sibling of rgb_folder
+        :return: FrameStore
+        """
+        path = default_store_path(rgb_folder) if path is None else path
+        filenames = list_frame_files(rgb_folder)
+        frame_size = CHANNELS * height * width
+        pack_id = uuid.uuid4().bytes
+
+        def write_frames(tmp_path):
+            planes = np.memmap(tmp_path, dtype=np.uint8, mode='w+', shape=(len(filenames) * frame_size + PACK_ID_SIZE,))
+            frames = planes[:len(filenames) * frame_size].reshape(len(filenames), frame_size)
+            for frame_num, filename in enumerate(filenames):
+                with open(os.path.join(rgb_folder, filename), 'rb') as f:
+                    # read straight into the mapped slot, no intermediate buffers
+                    if f.readinto(memoryview(frames[frame_num])) != frame_size:
+                        raise ValueError('{filename} is not a {width}x{height} planar RGB frame'.format(
+                            filename=filename, width=width, height=height))
+            planes[-PACK_ID_SIZE:] = np.frombuffer(pack_id, dtype=np.uint8)
+            planes.flush()
+            del frames, planes
+
+        def write_header(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump({'source': os.path.abspath(rgb_folder),
+                           'fingerprint': cls.get_fingerprint(rgb_folder, filenames),
+                           'frame_count': len(filenames),
+                           'height': height,
+                           'width': width,
+                           'pack_id': pack_id.hex()}, f)
+
+        # both files are written under unique temporary names first, so an interrupted or concurrent pack never leaves
+        # a truncated store behind, and the pack id tells readers whether the file and header they opened match
+        write_atomically(path, write_frames)
+        write_atomically(path + '.json', write_header)
+        return cls(path)
+
+    @classmethod
+    def open(cls, rgb_folder, path=None, width=FRAME_WIDTH, height=FRAME_HEIGHT):
+        """
+        Opens the packed store of a frame folder, (re)packing it only if it is missing or out of date
+        :return: FrameStore
+        """
+        path = default_store_path(rgb_folder) if path is None else path
+        store = cls.open_packed(rgb_folder, path, width, height)
+        if store is not None:
+            return store
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with pack_lock(path):
+            # another job may have packed the folder while this one waited for the lock
+            store = cls.open_packed(rgb_folder, path, width, height)
+            if store is not None:
+                return store
+            return cls.pack(rgb_folder, path, width, height)
+
+    @classmethod
+    def open_packed(cls, rgb_folder, path, width=FRAME_WIDTH, height=FRAME_HEIGHT):
+        """
+        :return: the packed store of a frame folder, None if it is missing, out of date or being replaced
+        """
+        try:
+            store = cls(path)
+        except (OSError, ValueError, KeyError):
+            # missing, written by an older version, or replaced while it was opened
+            return None
+        if store.width == width and store.height == height and store.fingerprint == cls.get_fingerprint(rgb_folder):
+            return store
+        return None
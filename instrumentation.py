@@ -0,0 +1,157 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+from collections import Counter, namedtuple
+
+logger = logging.getLogger(__name__)
+
+# events emitted to the subscribers of an Instrumentation
+StageStarted = namedtuple('StageStarted', ['stage'])
+StageFinished = namedtuple('StageFinished', ['stage', 'seconds'])
+CounterUpdated = namedtuple('CounterUpdated', ['counter', 'value'])
+ProfileCaptured = namedtuple('ProfileCaptured', ['stage', 'profile'])
+
+
+class _NullStage:
+    # stage context used when instrumentation is disabled, shared so that disabled stages allocate nothing
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.start = None
+        self.profile = None
+
+    def __enter__(self):
+        instrumentation = self.instrumentation
+        # only the outermost stage is profiled, a single profiler can be active at a time
+        if instrumentation.profile and instrumentation.depth == 0:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        instrumentation.depth += 1
+        instrumentation.emit(StageStarted(self.name))
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        instrumentation = self.instrumentation
+        instrumentation.depth -= 1
+        if self.profile is not None:
+            self.profile.disable()
+            instrumentation.profiles.setdefault(self.name, []).append(self.profile)
+        instrumentation.timings[self.name] += seconds
+        instrumentation.emit(StageFinished(self.name, seconds))
+        if self.profile is not None:
+            instrumentation.emit(ProfileCaptured(self.name, self.profile))
+        return False
+
+
+class Instrumentation:
+    """
+    Per-stage timers, counters and optional cProfile capture of an evaluation.
+
+    Subscribers are called with a typed event (StageStarted, StageFinished, CounterUpdated or ProfileCaptured) as soon
+    as it happens, e.g. EvaluatorWorker forwards them to the GUI through Signals.instrumentation_event. A disabled
+    instrumentation (the default of the evaluators) does not time, count or emit anything.
+    """
+
+    def __init__(self, enabled=True, profile=False):
+        self.enabled = enabled
+        # capture a cProfile of every top-level stage
+        self.profile = enabled and profile
+        # total seconds spent in each stage
+        self.timings = Counter()
+        # e.g. frames_decoded, bytes_read, blocks_matched, face_detector_invocations
+        self.counters = Counter()
+        # cProfile.Profile objects of each top-level stage
+        self.profiles = {}
+        self.subscribers = []
+        self.depth = 0
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def emit(self, event):
+        for callback in self.subscribers:
+            callback(event)
+
+    def stage(self, name):
+        """
+        Times a stage of the evaluation: `with instrumentation.stage('motion'): ...`. Stages can be nested and the same
+        stage can run several times, its timings add up.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def count(self, counter, amount=1):
+        if not self.enabled:
+            return
+        self.counters[counter] += amount
+        self.emit(CounterUpdated(counter, self.counters[counter]))
+
+    def merge(self, report):
+        """
+        Adds the timings and counters of another instrumentation, e.g. one that ran in a worker process
+        :param report: dictionary as returned by get_report()
+        """
+        if not self.enabled:
+            return
+        for name, seconds in report['timings'].items():
+            self.timings[name] += seconds
+        for counter, amount in report['counters'].items():
+            self.count(counter, amount)
+
+    def get_report(self):
+        return {'timings': dict(self.timings), 'counters': dict(self.counters)}
+
+    def get_profile_stats(self, stage, sort='cumulative', limit=30):
+        """
+        :return: the cProfile statistics of a stage as text
+        """
+        output = io.StringIO()
+        profiles = self.profiles.get(stage, [])
+        if profiles:
+            stats = pstats.Stats(profiles[0], stream=output)
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def dump_profiles(self, folder):
+        # writes one .prof file per stage, to be opened with pstats or snakeviz
+        os.makedirs(folder, exist_ok=True)
+        for stage, profiles in self.profiles.items():
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(os.path.join(folder, stage + '.prof'))
+
+
+NULL_INSTRUMENTATION = Instrumentation(enabled=False)
+
+
+def log_event(event):
+    # subscriber writing every event to the log
+    if isinstance(event, StageFinished):
+        logger.info('%s took %.3fs', event.stage, event.seconds)
+    elif isinstance(event, StageStarted):
+        logger.debug('%s started', event.stage)
+    elif isinstance(event, CounterUpdated):
+        logger.debug('%s: %s', event.counter, event.value)
+    elif isinstance(event, ProfileCaptured):
+        logger.debug('captured profile of %s', event.stage)
@@ -0,0 +1,169 @@
+import os
+from collections import OrderedDict
+
+from PyQt5.QtCore import QObject, QThreadPool, pyqtSignal, pyqtSlot
+
+from EvaluatorWorker import EvaluatorWorker
+
+# videos evaluated at the same time, the other jobs wait in the thread pool's queue
+MAX_CONCURRENT_JOBS = 2
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class EvaluationJob:
+    """
+    A video queued for evaluation, and its progress
+    """
+
+    def __init__(self, job_id, rgb_folder, wav_file, jpg_folder, worker):
+        self.job_id = job_id
+        self.rgb_folder = rgb_folder
+        self.wav_file = wav_file
+        # frames played back or converted once the job is finished
+        self.jpg_folder = jpg_folder
+        self.worker = worker
+        # one of QUEUED, RUNNING, FINISHED, FAILED and CANCELLED
+        self.state = QUEUED
+        # latest progress report
+        self.label = ''
+        self.progress = 0.
+        # (frame_nums_to_write, audio, metadata) once finished
+        self.results = None
+        # error message if the job failed
+        self.error = None
+
+    @property
+    def name(self):
+        return os.path.basename(os.path.normpath(self.rgb_folder))
+
+    @property
+    def done(self):
+        return self.state in (FINISHED, FAILED, CANCELLED)
+
+
+class EvaluationJobManager(QObject):
+    """
+    Queue of evaluation jobs behind the GUI.
+
+    Every job runs an EvaluatorWorker on the manager's QThreadPool, whose size bounds the number of videos evaluated at
+    once, the others waiting in the pool's queue. Jobs report their own progress (throttled in the worker so the GUI
+    thread never falls behind), and can be cancelled whether queued or running. All the signals are emitted on the
+    thread the manager lives in, i.e. the GUI thread.
+    """
+    job_added = pyqtSignal(int)
+    # state or progress of a job changed
+    job_changed = pyqtSignal(int)
+    # a job finished with results, see EvaluationJob.results
+    job_finished = pyqtSignal(int)
+    # instrumentation event of a job
+    job_instrumentation_event = pyqtSignal(int, object)
+
+    def __init__(self, max_jobs=MAX_CONCURRENT_JOBS, **options):
+        """
+        :param max_jobs: maximum number of jobs running at the same time
+        :param options: passed to every EvaluatorWorker, e.g. engine or cache
+        """
+        super(EvaluationJobManager, self).__init__()
+        self.threadpool = QThreadPool()
+        self.threadpool.setMaxThreadCount(max_jobs)
+        self.options = options
+        self.jobs = OrderedDict()
+        # job of each worker's signals, to find the job a signal comes from
+        self.jobs_by_signals = {}
+        self.next_job_id = 0
+
+    def submit(self, rgb_folder, wav_file, jpg_folder=None):
+        """
+        Queues the evaluation of a video
+        :return: id of the job
+        """
+        worker = EvaluatorWorker(rgb_folder, wav_file, **self.options)
+        # the job keeps the worker, the pool must not delete it once it has run
+        worker.setAutoDelete(False)
+        job = EvaluationJob(self.next_job_id, rgb_folder, wav_file, jpg_folder, worker)
+        self.next_job_id += 1
+        self.jobs[job.job_id] = job
+        self.jobs_by_signals[worker.signals] = job
+
+        worker.signals.started.connect(self.job_started)
+        worker.signals.report_progress.connect(self.job_progressed)
+        worker.signals.finished_with_results.connect(self.job_succeeded)
+        worker.signals.failed.connect(self.job_failed)
+        worker.signals.cancelled.connect(self.job_cancelled)
+        worker.signals.instrumentation_event.connect(self.job_instrumented)
+        self.job_added.emit(job.job_id)
+        self.threadpool.start(worker)
+        return job.job_id
+
+    def cancel(self, job_id):
+        """
+        Cancels a job: a queued job never starts, a running one stops at its next chunk of frames or shot
+        """
+        job = self.jobs[job_id]
+        if job.done:
+            return
+        job.worker.cancel()
+        if job.state == QUEUED and self.threadpool.tryTake(job.worker):
+            # it never reaches run(), which would report the cancellation
+            job.label = 'Cancelled'
+            self.set_state(job, CANCELLED)
+
+    def cancel_all(self):
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+
+    def get_job(self, job_id):
+        return self.jobs[job_id]
+
+    def get_latest_finished_job(self):
+        for job in reversed(self.jobs.values()):
+            if job.state == FINISHED:
+                return job
+        return None
+
+    def set_state(self, job, state):
+        job.state = state
+        self.job_changed.emit(job.job_id)
+
+    def get_sender_job(self):
+        return self.jobs_by_signals[self.sender()]
+
+    @pyqtSlot()
+    def job_started(self):
+        self.set_state(self.get_sender_job(), RUNNING)
+
+    @pyqtSlot(tuple)
+    def job_progressed(self, information):
+        job = self.get_sender_job()
+        job.label, job.progress = information
+        self.job_changed.emit(job.job_id)
+
+    @pyqtSlot(tuple)
+    def job_succeeded(self, results):
+        job = self.get_sender_job()
+        job.results = results
+        job.progress = 1.
+        self.set_state(job, FINISHED)
+        self.job_finished.emit(job.job_id)
+
+    @pyqtSlot(str)
+    def job_failed(self, error):
+        job = self.get_sender_job()
+        job.error = error
+        job.label = error
+        self.set_state(job, FAILED)
+
+    @pyqtSlot(object)
+    def job_instrumented(self, event):
+        self.job_instrumentation_event.emit(self.get_sender_job().job_id, event)
+
+    @pyqtSlot()
+    def job_cancelled(self):
+        job = self.get_sender_job()
+        job.label = 'Cancelled'
+        self.set_state(job, CANCELLED)
@@ -0,0 +1,82 @@
+import threading
+import time
+
+# minimum time in seconds between two progress reports of a job, the reports in between are coalesced
+PROGRESS_INTERVAL = .1
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job once it has been cancelled, see CancellationToken.check
+    """
+
+
+class CancellationToken:
+    """
+    Flag shared between a job and whoever may cancel it. Long running code calls check() between units of work
+    (chunks of frames, shots), so a cancelled job stops within one unit.
+    """
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def check(self):
+        """
+        :raises JobCancelled: if the job has been cancelled
+        """
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+
+class ProgressThrottle:
+    """
+    Forwards progress reports at most once every interval seconds.
+
+    Reports arriving in between replace each other instead of queueing up, so the receiver (e.g. the GUI thread) only
+    ever gets the latest one. Completion reports (fraction 1) always go through, and flush() delivers the report held
+    back last. Has the same emit() method as a pyqtSignal, so it can stand in for the evaluators' report_progress.
+    """
+
+    def __init__(self, emit, interval=PROGRESS_INTERVAL):
+        """
+        :param emit: function receiving the (label, fraction) tuples let through
+        """
+        self._emit = emit
+        self.interval = interval
+        self.last_emit_time = None
+        # latest report held back, if any
+        self.pending = None
+        self.lock = threading.Lock()
+
+    def emit(self, information):
+        now = time.monotonic()
+        with self.lock:
+            if self.last_emit_time is not None and now - self.last_emit_time < self.interval and information[1] < 1:
+                self.pending = information
+                return
+            self.pending = None
+            self.last_emit_time = now
+        self._emit(information)
+
+    def flush(self):
+        with self.lock:
+            information = self.pending
+            self.pending = None
+        if information is not None:
+            self._emit(information)
+
+
+class ThrottledSignals:
+    """
+    Signals handed to an evaluator in place of the worker's, with progress reports going through a ProgressThrottle
+    """
+
+    def __init__(self, signals, interval=PROGRESS_INTERVAL):
+        self.report_progress = ProgressThrottle(signals.report_progress.emit, interval)
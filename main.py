@@ -1,18 +1,15 @@
 #!/usr/bin/env python3
 import os
 import sys
-import time
-from typing import Tuple
 
-from PyQt5.QtCore import QThreadPool, pyqtSlot
+from PyQt5.QtCore import Qt, pyqtSlot
 from PyQt5.QtWidgets import QApplication, QLabel, QProgressBar, QWidget, QFileDialog, QPushButton, QVBoxLayout, \
-    QGroupBox, QHBoxLayout
-from pynput.keyboard import Controller
-from wavio import Wav
+    QGroupBox, QHBoxLayout, QListWidget, QListWidgetItem
 
-from EvaluatorWorker import EvaluatorWorker
-from video_converter import VideoConverter
-from video_player import VideoPlayer
+from analysis_cache import AnalysisCache
+from instrumentation import StageFinished
+from job_manager import FINISHED, EvaluationJobManager
+from video_metadata import DEFAULT_FPS
 
 
 class Gui(QWidget):
@@ -23,7 +20,7 @@ class Gui(QWidget):
         self.left = 0
         self.top = 0
         self.width = 1000
-        self.height = 360
+        self.height = 480
 
         self.jpgFolder = None
         self.rgbFolder = None
@@ -32,12 +29,31 @@ class Gui(QWidget):
         self.playJpgFolder = None
         self.playWavFile = None
 
-        self.threadpool = QThreadPool()
+        # evaluation results of previously analysed videos
+        self.analysis_cache = AnalysisCache()
+
+        # queue of videos being evaluated, a few at a time in the background
+        self.job_manager = EvaluationJobManager(cache=self.analysis_cache)
+        self.job_manager.job_added.connect(self.add_job_item)
+        self.job_manager.job_changed.connect(self.update_job)
+        self.job_manager.job_finished.connect(self.evaluation_complete)
+        self.job_manager.job_instrumentation_event.connect(self.log_instrumentation_event)
+        # list item of each job
+        self.job_items = {}
+        # results of the job played by the Play button
+        self.frame_nums_to_write = None
+        self.audio = None
+        self.metadata = None
+        self.jpg_folder_to_play = None
+        # job whose results these are, and the player of its summary, kept so that playing it again is immediate
+        self.results_job_id = None
+        self.summary_player = None
 
         self.playing_video = False
         self.video_paused = False
 
-        self.keyboard_emulator = Controller()
+        # presses p in the playback window to pause it, created on the first pause
+        self.keyboard_emulator = None
 
         self.initUI()
 
@@ -71,7 +87,7 @@ class Gui(QWidget):
 
     def createOnlineModeButtons(self: 'Gui') -> QGroupBox:
         onlineModeGroup = QGroupBox("Choose your JPG, RGB, and WAV Files/Folders for video evaluation")
-        onlineModeGroup.setFixedHeight(250)
+        onlineModeGroup.setFixedHeight(370)
 
         groupLayout = QVBoxLayout()
 
@@ -104,6 +120,15 @@ class Gui(QWidget):
         evalLayout.addLayout(evalBox)
         groupLayout.addLayout(evalLayout)
 
+        # queued, running and finished evaluations, the selected one is shown above and played
+        jobsLayout = QHBoxLayout()
+        self.jobs_list = QListWidget()
+        self.jobs_list.setFixedHeight(90)
+        self.jobs_list.currentItemChanged.connect(self.select_job)
+        jobsLayout.addWidget(self.jobs_list)
+        jobsLayout.addWidget(self.createButton('Cancel', self.cancel_job))
+        groupLayout.addLayout(jobsLayout)
+
         playLayout = QHBoxLayout()
         playBox = QVBoxLayout()
         self.play_converted_video_button = self.createButton('Play', self.play_converted_video)
@@ -157,18 +182,27 @@ class Gui(QWidget):
 
         return groupBox
 
+    def press_pause_key(self: 'Gui'):
+        if self.keyboard_emulator is None:
+            from pynput.keyboard import Controller
+
+            self.keyboard_emulator = Controller()
+        self.keyboard_emulator.press('p')
+        self.keyboard_emulator.release('p')
+
     @pyqtSlot()
     def play_video(self: 'Gui'):
         if not self.playing_video:
+            from video_player import VideoPlayer
+
             self.playing_video = True
-            self.video_player = VideoPlayer(self.playJpgFolder, self.playWavFile, 30)
+            self.video_player = VideoPlayer(self.playJpgFolder, self.playWavFile, DEFAULT_FPS)
             self.play_video_button.setText('Pause')
             self.video_player.play()
             self.play_video_button.setText('Play')
             self.playing_video = False
         else:
-            self.keyboard_emulator.press('p')
-            self.keyboard_emulator.release('p')
+            self.press_pause_key()
             self.video_paused = not self.video_paused
             if self.video_paused:
                 self.play_video_button.setText('Play')
@@ -205,47 +239,92 @@ class Gui(QWidget):
 
     @pyqtSlot()
     def evaulate_video(self: 'Gui'):
-        worker = EvaluatorWorker(self.rgbFolder, self.wavFile)
-        worker.signals.finished_with_results.connect(self.evaluation_complete)
-        worker.signals.report_progress.connect(self.setProgress)
-        self.threadpool.start(worker)
+        if self.rgbFolder is None or self.wavFile is None:
+            self.evaluatorProgressLabel.setText('Choose the RGB folder and WAV file to evaluate first')
+            return
+        # the video is queued, more videos can be chosen and queued while it runs
+        self.job_manager.submit(self.rgbFolder, self.wavFile, self.jpgFolder)
+
+    @pyqtSlot(int)
+    def add_job_item(self: 'Gui', job_id: int):
+        item = QListWidgetItem()
+        item.setData(Qt.UserRole, job_id)
+        self.job_items[job_id] = item
+        self.jobs_list.addItem(item)
+        self.jobs_list.setCurrentItem(item)
+        self.update_job(job_id)
+
+    @pyqtSlot(int)
+    def update_job(self: 'Gui', job_id: int):
+        job = self.job_manager.get_job(job_id)
+        self.job_items[job_id].setText('{name}: {state} {progress}%'.format(
+            name=job.name, state=job.state, progress=int(round(100 * job.progress))))
+        current = self.jobs_list.currentItem()
+        if current is not None and current.data(Qt.UserRole) == job_id:
+            self.setProgress((job.label, job.progress))
 
-    def setProgress(self: 'Gui', information: Tuple[str, float]):
+    @pyqtSlot()
+    def select_job(self: 'Gui'):
+        current = self.jobs_list.currentItem()
+        if current is not None:
+            self.update_job(current.data(Qt.UserRole))
+
+    @pyqtSlot()
+    def cancel_job(self: 'Gui'):
+        current = self.jobs_list.currentItem()
+        if current is not None:
+            self.job_manager.cancel(current.data(Qt.UserRole))
+
+    def setProgress(self: 'Gui', information):
+        # progress reports are throttled by the workers, so updating the widgets right away keeps the GUI responsive
         label = information[0]
         percentComplete = information[1]
         progress = max(min(100, round(100 * percentComplete)), 0)
-        print(label)
-        print(progress)
-
         self.evaluatorProgressLabel.setText(label)
-
-        # Trying this to prevent obscure error
-        time.sleep(1)
-
         self.evaluator_progress_bar.setValue(progress)
 
-    def evaluation_complete(self: 'Gui', information: Tuple[list, Wav]):
-        frame_nums_to_write = information[0]
-        audio = information[1]
-        self.frame_nums_to_write = frame_nums_to_write
-        self.audio = audio
-
-    def play_converted_video(self: 'Gui'):
-        self.converter.play()
+    @pyqtSlot(int, object)
+    def log_instrumentation_event(self: 'Gui', job_id: int, event):
+        # per-shot stages are too chatty, only report the top-level ones
+        if isinstance(event, StageFinished) and event.stage not in ('motion', 'audio', 'faces'):
+            print('{name}: {stage} took {seconds:.2f}s'.format(name=self.job_manager.get_job(job_id).name,
+                                                               stage=event.stage, seconds=event.seconds))
+
+    @pyqtSlot(int)
+    def evaluation_complete(self: 'Gui', job_id: int):
+        # the latest finished video is the one played, unless another finished job is selected
+        self.use_job_results(self.job_manager.get_job(job_id))
+
+    def use_job_results(self: 'Gui', job):
+        if job.job_id == self.results_job_id:
+            return
+        self.frame_nums_to_write, self.audio, self.metadata = job.results
+        self.jpg_folder_to_play = job.jpg_folder
+        self.results_job_id = job.job_id
+        self.summary_player = None
 
     @pyqtSlot()
     def play_converted_video(self: 'Gui'):
         if not self.playing_video:
+            current = self.jobs_list.currentItem()
+            if current is not None and self.job_manager.get_job(current.data(Qt.UserRole)).state == FINISHED:
+                self.use_job_results(self.job_manager.get_job(current.data(Qt.UserRole)))
+            if self.frame_nums_to_write is None or self.jpg_folder_to_play is None:
+                self.evaluatorProgressLabel.setText('Evaluate a video with its JPG folder before playing it')
+                return
+            if self.summary_player is None:
+                from video_player import SummaryPlayer
+
+                # plays the selections straight from the jpg frames and the audio track
+                self.summary_player = SummaryPlayer(self.frame_nums_to_write, self.jpg_folder_to_play, self.audio.data,
+                                                    self.metadata.fps, self.audio.rate, self.audio.sampwidth)
             self.playing_video = True
-            converter = VideoConverter(self.frame_nums_to_write, self.jpgFolder, self.audio.data, 30, \
-                                       self.audio.rate, self.audio.sampwidth)
             self.play_converted_video_button.setText('Pause')
-            converter.play()
+            self.summary_player.play()
             self.play_converted_video_button.setText('Play')
             self.playing_video = False
         else:
-            self.keyboard_emulator.press('p')
-            self.keyboard_emulator.release('p')
+            self.press_pause_key()
             self.video_paused = not self.video_paused
             if self.video_paused:
                 self.play_converted_video_button.setText('Play')
@@ -256,4 +335,8 @@ class Gui(QWidget):
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     ex = Gui()
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    # stop the evaluations still running instead of waiting for them to complete
+    ex.job_manager.cancel_all()
+    ex.job_manager.threadpool.waitForDone()
+    sys.exit(exit_code)
@@ -0,0 +1,380 @@
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+from scipy import ndimage
+
+# learning rate of the background subtractor
+ALPHA = .01
+# size of the matching blocks in pixels
+BLOCK_SIZE = 4
+# blockmatching's BackgroundSubtractor defaults: foreground threshold and gaussian blur / median filter size
+FOREGROUND_THRESHOLD = 10
+FOREGROUND_SIGMA = 3
+# bytes of full resolution frames converted at once when extracting foregrounds
+PREPROCESS_CHUNK_BYTES = 16 * 1024 * 1024
+# width of the frames the motion is estimated on, narrower frames are not upscaled
+ANALYSIS_WIDTH = 160
+
+# foreground extractors of the current thread, their buffers are reused from one shot to the next
+_extractors = threading.local()
+
+
+def get_analysis_size(height, width, max_width=ANALYSIS_WIDTH):
+    """
+    Returns the size frames are downscaled to before estimating their motion. The cost per frame does not grow with
+    the resolution of the video, and the scores of a 1080p video are on the same scale as the ones of a 320x180 one.
+    :return: (analysis height, analysis width)
+    """
+    if width <= max_width:
+        return height, width
+    return int(height * max_width / float(width)), max_width
+
+
+class ForegroundExtractor:
+    """
+    Grayscale conversion, downscaling and background subtraction of the frames of a shot, a chunk of frames at a time.
+
+    Gives the same foregrounds as converting each frame with cv2.cvtColor and imutils.resize and feeding it to
+    blockmatching's BackgroundSubtractor (see get_foregrounds_blockmatching), but every step writes into buffers that
+    are allocated once and reused for the following shots, and the running background is updated in a pair of
+    ping-pong buffers instead of being copied. Once the buffers fit the longest shot, extracting foregrounds does not
+    allocate anything per frame.
+    """
+
+    def __init__(self, alpha=ALPHA, threshold=FOREGROUND_THRESHOLD, sigma=FOREGROUND_SIGMA):
+        # learning rate of the background
+        self.alpha = alpha
+        # differences below this value are not foreground
+        self.threshold = threshold
+        # standard deviation of the gaussian blur, also the size of the median filter
+        self.sigma = sigma
+        # reusable buffers, keyed by name
+        self.buffers = {}
+
+    def get_buffer(self, name, shape, dtype=np.uint8):
+        """
+        Returns a buffer of at least shape[0] items of the given shape, reallocated only when it is too small
+        """
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape[1:] != shape[1:] or len(buffer) < shape[0]:
+            # grow geometrically so that slightly longer shots do not reallocate every time
+            length = shape[0] if buffer is None or buffer.shape[1:] != shape[1:] else max(shape[0], 2 * len(buffer))
+            buffer = np.zeros((length,) + tuple(shape[1:]), dtype=dtype)
+            self.buffers[name] = buffer
+        return buffer[:shape[0]]
+
+    def extract(self, shot_frames):
+        """
+        :param shot_frames: frames of the shot, (N, height, width, 3)
+        :return: (N, analysis height, analysis width) uint8 foregrounds, a view of a buffer that is overwritten by the
+        next call
+        """
+        frame_count, height, width = shot_frames.shape[:3]
+        analysis_height, analysis_width = get_analysis_size(height, width)
+        analysis_size = (analysis_height, analysis_width)
+        foregrounds = self.get_buffer('foregrounds', (frame_count,) + analysis_size)
+        if frame_count == 0:
+            return foregrounds
+        chunk = min(max(PREPROCESS_CHUNK_BYTES // shot_frames[0].nbytes, 1), frame_count)
+        resize = analysis_size != (height, width)
+
+        frames = self.get_buffer('frames', (chunk, height, width, 3))
+        gray = self.get_buffer('gray', (chunk, height, width)) if resize else None
+        # small[0] is the frame before the chunk, blockmatching's BackgroundSubtractor._oldf
+        small = self.get_buffer('small', (chunk + 1,) + analysis_size)
+        blurred = self.get_buffer('blurred', (chunk,) + analysis_size)
+        diff = self.get_buffer('diff', (chunk,) + analysis_size)
+        blurred_diff = self.get_buffer('blurred_diff', (chunk,) + analysis_size)
+        mask = self.get_buffer('mask', (chunk,) + analysis_size)
+        result = self.get_buffer('result', (chunk,) + analysis_size)
+        moving = self.get_buffer('moving', (chunk,) + analysis_size)
+        backgrounds = self.get_buffer('backgrounds', (2,) + analysis_size)
+        # frames with a border of zeros, for the median filter
+        border = self.sigma // 2
+        padded_size = (analysis_height + 2 * border, analysis_width + 2 * border)
+        padded = self.get_buffer('padded', (chunk,) + padded_size)
+        median = self.get_buffer('median', (chunk,) + padded_size)
+        interior = (slice(None), slice(border, border + analysis_height), slice(border, border + analysis_width))
+        # planes of each frame when the frames are views of planar data, e.g. of a FrameStore
+        planes = np.moveaxis(shot_frames, -1, 1)
+        planar = planes.flags['C_CONTIGUOUS']
+        current = 0
+        sigma = (0, self.sigma, self.sigma)
+
+        for start in range(0, frame_count, chunk):
+            end = min(start + chunk, frame_count)
+            n = end - start
+            # OpenCV needs interleaved contiguous frames, interleaving planes with cv2.merge is much faster than numpy
+            if planar:
+                for idx in range(n):
+                    frame_planes = planes[start + idx]
+                    cv2.merge((frame_planes[0], frame_planes[1], frame_planes[2]), dst=frames[idx])
+            else:
+                np.copyto(frames[:n], shot_frames[start:end])
+            if resize:
+                cv2.cvtColor(frames[:n].reshape(n * height, width, 3), cv2.COLOR_BGR2GRAY,
+                             dst=gray[:n].reshape(n * height, width))
+                for idx in range(n):
+                    cv2.resize(gray[idx], (analysis_width, analysis_height), dst=small[idx + 1],
+                               interpolation=cv2.INTER_AREA)
+            else:
+                cv2.cvtColor(frames[:n].reshape(n * height, width, 3), cv2.COLOR_BGR2GRAY,
+                             dst=small[1:n + 1].reshape(n * height, width))
+            ndimage.gaussian_filter(small[1:n + 1], sigma, output=blurred[:n])
+            if start == 0:
+                # the background starts as the first frame, blurred
+                np.copyto(small[0], blurred[0])
+                np.copyto(backgrounds[current], blurred[0])
+
+            # frame differences, blurred, then kept where they reach the threshold
+            rows = n * analysis_height
+            cv2.subtract(small[:n].reshape(rows, analysis_width), small[1:n + 1].reshape(rows, analysis_width),
+                         dst=diff[:n].reshape(rows, analysis_width))
+            ndimage.gaussian_filter(diff[:n], sigma, output=blurred_diff[:n])
+            cv2.threshold(blurred_diff[:n].reshape(rows, analysis_width), self.threshold - 1, 255,
+                          cv2.THRESH_BINARY, dst=mask[:n].reshape(rows, analysis_width))
+
+            # running average of the background, each frame is compared to the background including itself
+            for idx in range(n):
+                cv2.addWeighted(blurred[idx], self.alpha, backgrounds[current], 1. - self.alpha, 0.,
+                                dst=backgrounds[1 - current])
+                current = 1 - current
+                cv2.absdiff(backgrounds[current], small[idx + 1], dst=result[idx])
+
+            # like BackgroundSubtractor: 255 over the threshold, unchanged at the threshold, 0 under it
+            flat_result = result[:n].reshape(rows, analysis_width)
+            flat_moving = moving[:n].reshape(rows, analysis_width)
+            cv2.threshold(flat_result, self.threshold, 255, cv2.THRESH_BINARY, dst=flat_moving)
+            cv2.threshold(flat_result, self.threshold - 1, self.threshold, cv2.THRESH_BINARY, dst=flat_result)
+            cv2.max(flat_moving, flat_result, dst=flat_result)
+            cv2.bitwise_and(flat_result, mask[:n].reshape(rows, analysis_width), dst=flat_result)
+            # same as scipy.signal.medfilt2d on each frame, which pads with zeros: the zero borders keep the frames
+            # stacked in a single image apart
+            np.copyto(padded[:n][interior], result[:n])
+            cv2.medianBlur(padded[:n].reshape(-1, padded_size[1]), self.sigma,
+                           dst=median[:n].reshape(-1, padded_size[1]))
+            np.copyto(foregrounds[start:end], median[:n][interior])
+
+            # the last frame of the chunk is the previous frame of the next one
+            np.copyto(small[0], small[n])
+        return foregrounds
+
+
+def get_foregrounds(shot_frames, alpha=ALPHA):
+    """
+    Converts the frames of a shot to downscaled grayscale and extracts their foreground, see ForegroundExtractor
+    :param shot_frames: frames of the shot, (N, height, width, 3)
+    :return: (N, analysis height, analysis width) uint8 array of foregrounds, only valid until the next call from the
+    same thread
+    """
+    extractors = getattr(_extractors, 'by_alpha', None)
+    if extractors is None:
+        extractors = _extractors.by_alpha = {}
+    if alpha not in extractors:
+        extractors[alpha] = ForegroundExtractor(alpha)
+    return extractors[alpha].extract(shot_frames)
+
+
+def get_foregrounds_blockmatching(shot_frames, alpha=ALPHA):
+    """
+    Reference implementation of get_foregrounds, one frame at a time with blockmatching's BackgroundSubtractor
+    """
+    import imutils
+    from blockmatching import BackgroundSubtractor
+
+    analysis_height, analysis_width = get_analysis_size(*shot_frames.shape[1:3])
+    foregrounds = np.empty((len(shot_frames), analysis_height, analysis_width), dtype=np.uint8)
+    background = None
+    for idx, frame in enumerate(shot_frames):
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if analysis_width != frame.shape[1]:
+            frame = imutils.resize(frame, width=analysis_width)
+        if background is None:
+            background = BackgroundSubtractor(alpha, frame)
+        foregrounds[idx] = background.foreground(frame)
+    return foregrounds
+
+
+def get_blocks_per_pair(height, width):
+    """
+    Returns the number of blocks matched between two frames of the given size
+    """
+    analysis_height, analysis_width = get_analysis_size(height, width)
+    return (analysis_height // BLOCK_SIZE - 1) * (analysis_width // BLOCK_SIZE - 1)
+
+
+def get_motion_score_of_two_frames(meand):
+    """
+    Averages the length of the mean displacement vectors of the moving objects between two frames
+    :param meand: (objects, 2) array of mean displacements
+    """
+    return sum(np.sqrt(np.square(meand[:, 0]) + np.square(meand[:, 1]))) / meand.shape[0]
+
+
+class BlockMatchingBackend:
+    """
+    Reference backend using the blockmatching library, one frame pair at a time.
+    """
+    name = 'blockmatching'
+
+    def pair_scores(self, foregrounds):
+        """
+        :param foregrounds: (N, height, width) foregrounds of a shot
+        :return: (N - 1,) motion scores of each pair of consecutive frames
+        """
+        from blockmatching import block_matching, clustering
+
+        scores = np.zeros(max(len(foregrounds) - 1, 0))
+        for idx in range(1, len(foregrounds)):
+            XP, YP, XD, YD = block_matching(foregrounds[idx - 1], foregrounds[idx], BLOCK_SIZE, BLOCK_SIZE)
+            U, V, object_tops, meand = clustering(XD, YD, XP, YP)
+            if meand:
+                scores[idx - 1] = get_motion_score_of_two_frames(np.array(meand))
+        return scores
+
+
+class NumpyBlockMatchingBackend:
+    """
+    Vectorized SAD block matching over all the frame pairs of a shot at once.
+
+    Follows the blockmatching library: every block of the previous frame is searched for in a window of the current
+    frame (displacements of -2..1 pixels for 4x4 blocks, ties resolved in favour of no motion), blocks that moved are
+    grouped into 8-connected objects, and the score of a pair is the average length of the objects' most common
+    displacement. Unlike the library, large objects are not randomly split before taking the mode, so scores can
+    differ slightly from the reference backend.
+    """
+    name = 'numpy'
+
+    def pair_scores(self, foregrounds):
+        pairs = len(foregrounds) - 1
+        if pairs < 1:
+            return np.zeros(0)
+        size = BLOCK_SIZE
+        half = size // 2
+        height, width = foregrounds.shape[1:]
+        # the last row and column of blocks have no search window, just like in the library
+        rows = height // size - 1
+        cols = width // size - 1
+
+        old = foregrounds[:-1].astype(np.float32)
+        new = foregrounds[1:].astype(np.float32)
+        blocks = old[:, half:half + rows * size, half:half + cols * size].reshape(pairs, rows, size, cols, size)
+
+        # sum of (clipped) differences for every candidate offset, in the library's search order
+        costs = np.empty((size * size, pairs, rows, cols), dtype=np.float32)
+        for ki in range(size):
+            for kj in range(size):
+                candidates = new[:, ki:ki + rows * size, kj:kj + cols * size].reshape(pairs, rows, size, cols, size)
+                costs[ki * size + kj] = np.clip(candidates - blocks, 0, 255).sum(axis=(2, 4))
+        best = np.argmin(costs, axis=0)
+        # no motion wins any tie with the best candidate
+        center = half * size + half
+        best[costs[center] == costs.min(axis=0)] = center
+        dy = best // size - half
+        dx = best % size - half
+
+        # group moving blocks into objects, 8-connected within each pair only
+        structure = np.zeros((3, 3, 3), dtype=bool)
+        structure[1] = True
+        labels, objects = ndimage.label((dy != 0) | (dx != 0), structure=structure)
+        if objects == 0:
+            return np.zeros(pairs)
+        moving = labels > 0
+        object_labels = labels[moving] - 1
+        pair_of_object = np.zeros(objects, dtype=np.int64)
+        pair_of_object[object_labels] = np.nonzero(moving)[0]
+
+        # most common displacement of each object (smallest value on ties, like scipy.stats.mode)
+        mode_dy = self._mode(object_labels, dy[moving] + half, objects, size) - half
+        mode_dx = self._mode(object_labels, dx[moving] + half, objects, size) - half
+        lengths = np.sqrt(np.square(mode_dy) + np.square(mode_dx))
+
+        totals = np.bincount(pair_of_object, weights=lengths, minlength=pairs)
+        counts = np.bincount(pair_of_object, minlength=pairs)
+        return np.divide(totals, counts, out=np.zeros(pairs), where=counts > 0)
+
+    @staticmethod
+    def _mode(object_labels, values, objects, bins):
+        counts = np.bincount(object_labels * bins + values, minlength=objects * bins).reshape(objects, bins)
+        return np.argmax(counts, axis=1)
+
+
+class FarnebackBackend:
+    """
+    Dense optical flow (cv2.calcOpticalFlowFarneback) between consecutive foregrounds. The score of a pair is the
+    average flow magnitude over the pixels that are foreground in either frame.
+    """
+    name = 'farneback'
+
+    def pair_scores(self, foregrounds):
+        scores = np.zeros(max(len(foregrounds) - 1, 0))
+        for idx in range(1, len(foregrounds)):
+            mask = (foregrounds[idx - 1] > 0) | (foregrounds[idx] > 0)
+            if not mask.any():
+                continue
+            flow = cv2.calcOpticalFlowFarneback(foregrounds[idx - 1], foregrounds[idx], None,
+                                                0.5, 3, 15, 3, 5, 1.2, 0)
+            scores[idx - 1] = np.average(np.sqrt(np.square(flow[..., 0]) + np.square(flow[..., 1]))[mask])
+        return scores
+
+
+MOTION_BACKENDS = {
+    BlockMatchingBackend.name: BlockMatchingBackend,
+    NumpyBlockMatchingBackend.name: NumpyBlockMatchingBackend,
+    FarnebackBackend.name: FarnebackBackend,
+}
+
+DEFAULT_MOTION_BACKEND = NumpyBlockMatchingBackend.name
+
+
+def get_motion_backend(name=DEFAULT_MOTION_BACKEND):
+    if name not in MOTION_BACKENDS:
+        raise ValueError('Unknown motion backend {name}, expected one of: {backends}'.format(
+            name=name, backends=', '.join(MOTION_BACKENDS)))
+    return MOTION_BACKENDS[name]()
+
+
+def get_pair_scores(shot_frames, backend=DEFAULT_MOTION_BACKEND):
+    """
+    Returns the motion scores between consecutive frames of a shot
+    :param shot_frames: frames of the shot, (N, height, width, 3)
+    :param backend: name of the motion backend
+    :return: (N - 1,) array of motion scores
+    """
+    return get_motion_backend(backend).pair_scores(get_foregrounds(shot_frames))
+
+
+def benchmark_backends(shot_frames, backends=None):
+    """
+    Runs every motion backend on the same frames to compare their scores and speed
+    :return: dictionary in this format: {'numpy': {'motion_score': 1.2, 'frames_per_second': 300.0}, ...}
+    """
+    foregrounds = get_foregrounds(shot_frames)
+    results = {}
+    for name in MOTION_BACKENDS if backends is None else backends:
+        backend = get_motion_backend(name)
+        # warm up (e.g. numba compilation) outside of the timed run
+        backend.pair_scores(foregrounds[:2])
+        start = time.perf_counter()
+        scores = backend.pair_scores(foregrounds)
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            'motion_score': float(np.average(scores)) if len(scores) else 0.,
+            'frames_per_second': len(foregrounds) / elapsed if elapsed > 0 else float('inf'),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    # A/B the motion backends on a range of frames: ./motion.py <rgb folder> [start] [end]
+    from frame_store import FrameStore
+
+    store = FrameStore.open(sys.argv[1])
+    start = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    end = int(sys.argv[3]) if len(sys.argv) > 3 else min(len(store), start + 300)
+    for name, result in benchmark_backends(store[start:end]).items():
+        print('{name:>14}: motion score {motion_score:.4f}, {frames_per_second:.1f} frames/s'.format(
+            name=name, **result))
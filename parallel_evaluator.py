@@ -0,0 +1,89 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from evaluator import Evaluator
+from frame_store import FrameStore
+from instrumentation import Instrumentation
+from motion import get_blocks_per_pair
+
+# frame stores opened by the current worker process, keyed by path
+_stores = {}
+
+
+def _init_worker():
+    # every process evaluates its own shot, so keep each of them on a single core to avoid oversubscription
+    cv2.setNumThreads(1)
+    # numba reads this when it is first imported, which spares the workers importing it just to set the threads
+    os.environ['NUMBA_NUM_THREADS'] = '1'
+
+
+def _evaluate_shot_features(store_path, start, end, motion_backend, face_backend, instrumented):
+    """
+    Computes the motion scores and face flag of one shot inside a worker process. Frames are read from the
+    memory-mapped frame store, so only the store's path and the shot boundaries cross the process boundary.
+    :return: (motion_scores, face_detected, instrumentation report)
+    """
+    if store_path not in _stores:
+        _stores[store_path] = FrameStore(store_path)
+    shot_frames = _stores[store_path][start:end]
+    instrumentation = Instrumentation(enabled=instrumented)
+    with instrumentation.stage('motion'):
+        motion_scores = Evaluator.get_shot_motion_scores(shot_frames, motion_backend)
+    instrumentation.count('blocks_matched', len(motion_scores) * get_blocks_per_pair(*shot_frames.shape[1:3]))
+    with instrumentation.stage('faces'):
+        face_detected = Evaluator.detect_faces(shot_frames, face_backend, instrumentation)
+    return motion_scores, face_detected, instrumentation.get_report()
+
+
+class ParallelEvaluator(Evaluator):
+    """
+    Evaluator that farms the shots out to a pool of worker processes.
+
+    Workers share the frames through the memory-mapped frame store instead of receiving pickled arrays, and the results
+    are merged back into self.shots by shot number, so the outcome does not depend on completion order.
+    """
+
+    def __init__(self, *args, workers=None, **kwargs):
+        # number of worker processes, defaults to the number of cores
+        self.workers = workers if workers is not None else os.cpu_count()
+        super(ParallelEvaluator, self).__init__(*args, **kwargs)
+
+    @property
+    def scene_detection_workers(self):
+        return self.workers
+
+    def evaluate_shots(self):
+        # forking a process that already loaded numba/scipy can deadlock, start clean interpreters instead
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_worker) as executor:
+            # submit the longest shots first so that a long shot does not end up alone at the tail of the run
+            futures = {}
+            for shot in sorted(self.shots, key=lambda x: x.end - x.start, reverse=True):
+                future = executor.submit(_evaluate_shot_features, self.frames.path, shot.start, shot.end,
+                                         self.motion_backend, self.face_backend, self.instrumentation.enabled)
+                futures[future] = shot
+
+            try:
+                # audio is cheap, score it here while the workers are busy
+                audio_energy = self.get_audio_energy()
+                self.shots.rows['audio_score'] = audio_energy.get_rms(self.shots.rows['start'],
+                                                                      self.shots.rows['end'])
+
+                for shots_evaluated, future in enumerate(as_completed(futures), 1):
+                    self.cancellation.check()
+                    shot = futures[future]
+                    shot.motion_scores, shot.face_detected, report = future.result()
+                    self.instrumentation.merge(report)
+                    shot.motion_score = shot.get_motion_score()
+                    if shots_evaluated % 10 == 0 and self.signals is not None:
+                        self.signals.report_progress.emit((
+                            'Evaluating shots and calculating scores... {shot_num}/{shots} shots evaluated.'.format(
+                                shot_num=shots_evaluated, shots=len(self.shots)), shots_evaluated / len(self.shots)))
+            except BaseException:
+                # e.g. cancelled, drop the shots that have not started yet instead of waiting for them
+                for future in futures:
+                    future.cancel()
+                raise
@@ -0,0 +1,338 @@
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+import pygame
+
+# decoded frames kept ahead of the one on screen, 2 seconds at 30 fps
+BUFFER_SIZE = 60
+# seconds skipped by the left and right arrow keys
+SEEK_SECONDS = 5
+# height in pixels of the seek bar at the bottom of the window, click or drag on it to scrub
+SEEK_BAR_HEIGHT = 8
+
+
+class FramePrefetcher:
+    """
+    Decodes the frames of a video ahead of playback in a background thread.
+
+    Decoded frames wait in a bounded queue, so the render loop only blits them and a slow disk only stalls playback
+    once the buffer runs dry. Frames are scaled to the display size while decoding, and frames the player no longer
+    needs (because it fell behind the audio) are skipped without being read. seek() restarts decoding from any frame,
+    the frames decoded before the seek are dropped.
+    """
+
+    def __init__(self, paths, size=None, buffer_size=BUFFER_SIZE):
+        """
+        :param paths: path of every frame, in playback order
+        :param size: (width, height) the frames are scaled to, None to keep their size
+        :param buffer_size: maximum number of decoded frames waiting to be displayed
+        """
+        self.paths = paths
+        self.size = size
+        # first frame the player still needs, frames before it are skipped
+        self.next_needed = 0
+        # incremented by every seek, frames are queued along with the generation they were decoded in
+        self.generation = 0
+        self.seek_frame_num = 0
+        self.lock = threading.Lock()
+        self.frames = queue.Queue(maxsize=buffer_size)
+        # last frame returned by get() since the last seek, and its surface
+        self.frame_num = None
+        self.surface = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.decode_frames, daemon=True)
+        self.thread.start()
+
+    def decode_frames(self):
+        generation = None
+        frame_num = 0
+        while not self.stopped.is_set():
+            with self.lock:
+                if generation != self.generation:
+                    generation = self.generation
+                    frame_num = self.seek_frame_num
+            if frame_num >= len(self.paths):
+                # every frame is decoded, wait for a seek
+                self.stopped.wait(.01)
+                continue
+            if frame_num < self.next_needed:
+                frame_num += 1
+                continue
+            try:
+                surface = self.decode_frame(self.paths[frame_num], self.size)
+            except Exception as e:
+                # handed over to the render loop, which raises it
+                surface = e
+            # wait for room in the buffer, but give up as soon as playback stops or seeks
+            while not self.stopped.is_set() and generation == self.generation:
+                try:
+                    self.frames.put((generation, frame_num, surface), timeout=.1)
+                    break
+                except queue.Full:
+                    pass
+            frame_num += 1
+
+    @staticmethod
+    def decode_frame(path, size=None):
+        # OpenCV releases the GIL while decoding, so the render loop keeps running meanwhile
+        frame = cv2.imread(path)
+        if frame is None:
+            raise FileNotFoundError('Could not read frame {path}'.format(path=path))
+        if size is not None and (frame.shape[1], frame.shape[0]) != size:
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR)
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return pygame.image.frombuffer(frame.tobytes(), (frame.shape[1], frame.shape[0]), 'RGB')
+
+    def get(self, frame_num):
+        """
+        Returns the surface of a frame, dropping the decoded frames before it. Frames before the one of the previous
+        call (unless seek() was called in between) were already dropped, the previous frame is returned again instead.
+        :param frame_num: frame to display
+        :return: surface of the frame, the previous one if playback was stopped meanwhile
+        """
+        if self.frame_num is not None and frame_num <= self.frame_num:
+            return self.surface
+        self.next_needed = frame_num
+        while True:
+            try:
+                generation, decoded_frame_num, surface = self.frames.get(timeout=.1)
+            except queue.Empty:
+                if self.stopped.is_set():
+                    return self.surface
+                continue
+            if generation != self.generation:
+                # decoded before the last seek
+                continue
+            if isinstance(surface, Exception):
+                raise surface
+            if decoded_frame_num >= frame_num:
+                break
+        if self.size is not None and surface.get_size() != self.size:
+            # decoded before the window was resized
+            surface = pygame.transform.scale(surface, self.size)
+        self.frame_num = frame_num
+        self.surface = surface
+        return surface
+
+    def seek(self, frame_num):
+        # decode from frame_num on
+        with self.lock:
+            self.generation += 1
+            self.seek_frame_num = frame_num
+            self.next_needed = frame_num
+            self.frame_num = None
+        # make room for the frames of the new position
+        try:
+            while True:
+                self.frames.get_nowait()
+        except queue.Empty:
+            pass
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+class PlaybackClock:
+    """
+    Tells which frame should be on screen. Follows the position of pygame.mixer.music while the audio is playing, so
+    the video stays in sync with it, and a wall clock otherwise (e.g. once the audio is over).
+    """
+
+    def __init__(self, fps):
+        self.fps = fps
+        # wall clock time at which frame 0 was (or would have been) displayed
+        self.start_time = time.time()
+        self.pause_time = None
+        # position in seconds the audio was last started from, pygame.mixer.music.get_pos counts from there
+        self.audio_offset = 0.
+
+    def get_position(self):
+        # seconds since the start of the video
+        if self.pause_time is not None:
+            return self.pause_time - self.start_time
+        audio_position = pygame.mixer.music.get_pos()
+        if audio_position >= 0 and pygame.mixer.music.get_busy():
+            self.start_time = time.time() - self.audio_offset - audio_position / 1000.
+        return time.time() - self.start_time
+
+    def get_frame_num(self):
+        return int(self.get_position() * self.fps)
+
+    def get_time_to_next_frame(self):
+        return (self.get_frame_num() + 1) / float(self.fps) - self.get_position()
+
+    def pause(self):
+        self.pause_time = time.time()
+        pygame.mixer.music.pause()
+
+    def unpause(self):
+        self.start_time += time.time() - self.pause_time
+        self.pause_time = None
+        pygame.mixer.music.unpause()
+
+    def seek(self, position):
+        """
+        Moves playback to a position in seconds, paused playback stays paused
+        """
+        now = time.time()
+        self.start_time = now - position
+        if self.pause_time is not None:
+            self.pause_time = now
+        self.audio_offset = position
+        try:
+            pygame.mixer.music.play(0, start=position)
+            if self.pause_time is not None:
+                pygame.mixer.music.pause()
+        except pygame.error:
+            # the audio cannot seek (or the position is past its end), the wall clock takes over
+            pygame.mixer.music.stop()
+
+
+def init_playback():
+    """
+    Initializes pygame, called right before playing so that nothing else pays for it
+    :return: font of the timer
+    """
+    pygame.init()
+    # listing the system fonts the first time takes up to 8 seconds
+    return pygame.font.SysFont('Sans', 18)
+
+
+def get_seek_target(frame_num, frame_count, fps, key, segment_starts):
+    """
+    :param key: pygame key pressed
+    :param segment_starts: first frame of every segment of the video, in order
+    :return: frame to seek to for the key, None if the key does not seek
+    """
+    if key == pygame.K_RIGHT:
+        return min(frame_num + int(round(SEEK_SECONDS * fps)), frame_count - 1)
+    if key == pygame.K_LEFT:
+        return max(frame_num - int(round(SEEK_SECONDS * fps)), 0)
+    if key == pygame.K_HOME:
+        return 0
+    if key in (pygame.K_DOWN, pygame.K_PAGEDOWN):
+        # next segment
+        following = segment_starts[segment_starts > frame_num]
+        return int(following[0]) if len(following) else None
+    if key in (pygame.K_UP, pygame.K_PAGEUP):
+        # start of the segment, or of the previous one within its first second
+        preceding = segment_starts[segment_starts <= frame_num - int(round(fps))]
+        return int(preceding[-1]) if len(preceding) else 0
+    return None
+
+
+def draw_seek_bar(display, frame_num, frame_count, segment_starts):
+    # progress along the video, with a tick at the start of every segment
+    width, height = display.get_size()
+    top = height - SEEK_BAR_HEIGHT
+    display.fill((40, 40, 40), (0, top, width, SEEK_BAR_HEIGHT))
+    display.fill((255, 255, 0), (0, top, int(width * (frame_num + 1) / float(frame_count)), SEEK_BAR_HEIGHT))
+    for start in segment_starts[1:]:
+        display.fill((255, 255, 255), (int(width * start / float(frame_count)), top, 1, SEEK_BAR_HEIGHT))
+
+
+def play_frames(paths, audio_path, fps, font, caption='Summarized Video', segment_starts=None):
+    """
+    Plays frames along with their audio. Frames are displayed when the audio reaches them: frames that are late are
+    dropped and a frame stays on screen until the next one is due.
+    Press p to pause and unpause, the left and right arrows to go back or forward 5 seconds, the up and down arrows to
+    go to the previous or next segment and Home to start over. Click or drag on the bar at the bottom to scrub. The
+    window can be resized.
+    :param paths: path of every frame, in playback order
+    :param audio_path: WAV file played along the frames, or a file object holding one, e.g. an io.BytesIO
+    :param fps: frame rate of the video
+    :param font: pygame font of the timer
+    :param segment_starts: first frame of every segment (e.g. the clips of a summary, see timeline.Timeline), the
+    whole video is one segment if None
+    :return: (frames displayed, frames dropped)
+    """
+    if not paths:
+        return 0, 0
+    # the window starts at the size of the frames
+    first_frame = cv2.imread(paths[0])
+    if first_frame is None:
+        raise FileNotFoundError('Could not read frame {path}'.format(path=paths[0]))
+    display_height, display_width = first_frame.shape[:2]
+    game_display = pygame.display.set_mode((display_width, display_height))
+    pygame.display.set_caption(caption)
+    segment_starts = np.asarray(segment_starts if segment_starts is not None else [0])
+
+    total_minutes, total_seconds = divmod(int(len(paths) / float(fps)), 60)
+    prefetcher = FramePrefetcher(paths)
+
+    pygame.mixer.init()
+    if isinstance(audio_path, str):
+        pygame.mixer.music.load(audio_path)
+    else:
+        pygame.mixer.music.load(audio_path, 'wav')
+    # play once
+    pygame.mixer.music.play(0)
+    clock = PlaybackClock(fps)
+
+    displayed_frame_num = None
+    frames_displayed = 0
+    frames_dropped = 0
+    try:
+        while True:
+            seek_target = None
+            for event in pygame.event.get():
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_p:
+                        if clock.pause_time is not None:
+                            clock.unpause()
+                        else:
+                            clock.pause()
+                    else:
+                        target = get_seek_target(min(clock.get_frame_num(), len(paths) - 1), len(paths), fps,
+                                                 event.key, segment_starts)
+                        seek_target = target if target is not None else seek_target
+                elif event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION) and \
+                        (event.type == pygame.MOUSEBUTTONDOWN or event.buttons[0]):
+                    w, h = game_display.get_size()
+                    if event.pos[1] >= h - SEEK_BAR_HEIGHT * 2:
+                        seek_target = min(int(event.pos[0] / float(w) * len(paths)), len(paths) - 1)
+                elif event.type == pygame.VIDEORESIZE:
+                    w, h = pygame.display.get_surface().get_size()
+                    # keep the aspect ratio of the frames
+                    w = int(w / 16.) * 16
+                    h = int(w * display_height / float(display_width))
+                    game_display = pygame.display.set_mode((w, h), pygame.RESIZABLE)
+                    prefetcher.size = (w, h)
+            if seek_target is not None:
+                clock.seek(seek_target / float(fps))
+                prefetcher.seek(seek_target)
+                # redraw even if paused, and do not count the frames skipped as dropped
+                displayed_frame_num = None
+
+            frame_num = clock.get_frame_num()
+            if frame_num >= len(paths):
+                break
+            if displayed_frame_num is not None and frame_num < displayed_frame_num:
+                # the audio clock is coarse and can step back a frame, never play backwards because of it
+                frame_num = displayed_frame_num
+            if frame_num != displayed_frame_num:
+                img = prefetcher.get(frame_num)
+                if displayed_frame_num is not None and frame_num > displayed_frame_num + 1:
+                    frames_dropped += frame_num - displayed_frame_num - 1
+                minutes, seconds = divmod(frame_num // fps, 60)
+                text = font.render(
+                    '{minutes:02d}:{seconds:02d}/{total_minutes:02d}:{total_seconds:02d}'.format(
+                        minutes=minutes, seconds=seconds, total_minutes=total_minutes, total_seconds=total_seconds),
+                    True, (255, 255, 0))
+                img.blit(text, img.get_rect())
+                game_display.blit(img, (0, 0))
+                draw_seek_bar(game_display, frame_num, len(paths), segment_starts)
+                pygame.display.update()
+                displayed_frame_num = frame_num
+                frames_displayed += 1
+
+            # sleep until the next frame is due, but keep handling events while paused
+            pygame.time.wait(max(1, min(int(clock.get_time_to_next_frame() * 1000), 10)))
+    finally:
+        prefetcher.stop()
+        pygame.quit()
+    return frames_displayed, frames_dropped
@@ -0,0 +1,235 @@
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from frame_store import FrameStore
+
+# params for shot boundary detection
+SCENE_THRESHOLD = 30.0
+MIN_SCENE_LEN = 7
+# the approximate detection finds candidate cuts on a grid of about COARSE_WIDTH pixels per row, every 4th pixel of
+# 320x180 frames
+COARSE_WIDTH = 80
+# frames whose coarse score reaches this fraction of the threshold are scored again at full resolution
+CANDIDATE_RATIO = .5
+# frames converted to HSV at once
+BATCH_FRAMES = 256
+
+# frame stores opened by the current worker process, keyed by path
+_stores = {}
+
+
+def get_hsv(frames):
+    """
+    Converts a batch of frames to HSV with a single OpenCV call
+    :param frames: (N, height, width, 3) frames, in the channel order PySceneDetect's ContentDetector assumes (BGR)
+    :return: (N, height, width, 3) uint8 HSV frames
+    """
+    frames = np.ascontiguousarray(frames)
+    n, height, width, channels = frames.shape
+    hsv = cv2.cvtColor(frames.reshape(n * height, width, channels), cv2.COLOR_BGR2HSV)
+    return hsv.reshape(n, height, width, channels)
+
+
+def get_content_scores(hsv, previous_hsv):
+    """
+    Computes ContentDetector's frame score (average of the mean absolute hue, saturation and luminance differences)
+    of a batch of frames, to the same floating point value as PySceneDetect
+    :param hsv: (N, height, width, 3) HSV frames
+    :param previous_hsv: (N, height, width, 3) HSV frames preceding them
+    :return: (N,) scores
+    """
+    num_pixels = float(hsv.shape[1] * hsv.shape[2])
+    # integer sums are exact whatever the order they are computed in
+    deltas = np.abs(hsv.astype(np.int16) - previous_hsv).sum(axis=(1, 2), dtype=np.int64) / num_pixels
+    return (deltas[:, 0] + deltas[:, 1] + deltas[:, 2]) / 3.0
+
+
+def get_coarse_step(width):
+    """
+    Returns the spacing of the pixels of the coarse pass, so that its cost does not grow with the resolution
+    """
+    return max(int(round(width / float(COARSE_WIDTH))), 1)
+
+
+def get_cut_candidates(frames, start, end, threshold=SCENE_THRESHOLD, step=1, candidate_ratio=CANDIDATE_RATIO):
+    """
+    Finds the frames of [start, end) that score at least threshold against their preceding frame.
+
+    With a step of 1, every frame is scored at full resolution and the result is exactly ContentDetector's. With a
+    larger step, every frame is first scored on a grid of every step-th pixel, and only the frames scoring close to
+    the threshold there are scored again at full resolution. This is approximate: a cut whose change falls between
+    the pixels of the grid is missed.
+    :param frames: (N, height, width, 3) frames of the whole video, e.g. a FrameStore
+    :param step: spacing of the pixels of the coarse pass, 1 to score every frame at full resolution only
+    :return: (frame numbers, full resolution scores) of the frames reaching the threshold
+    """
+    start = max(start, 1)
+    if step == 1:
+        frame_nums = []
+        cut_scores = []
+        for batch_start in range(start, end, BATCH_FRAMES):
+            batch_end = min(batch_start + BATCH_FRAMES, end)
+            # the frame before the batch is part of it, to score the batch's first frame
+            hsv = get_hsv(frames[batch_start - 1:batch_end])
+            scores = get_content_scores(hsv[1:], hsv[:-1])
+            cuts = np.flatnonzero(scores >= threshold)
+            frame_nums.extend(int(batch_start + cut) for cut in cuts)
+            cut_scores.extend(float(scores[cut]) for cut in cuts)
+        return frame_nums, cut_scores
+
+    candidates = []
+    for batch_start in range(start, end, BATCH_FRAMES):
+        batch_end = min(batch_start + BATCH_FRAMES, end)
+        coarse = get_hsv(frames[batch_start - 1:batch_end, ::step, ::step])
+        scores = get_content_scores(coarse[1:], coarse[:-1])
+        candidates.extend(batch_start + np.flatnonzero(scores >= threshold * candidate_ratio))
+
+    frame_nums = []
+    cut_scores = []
+    for frame_num in candidates:
+        hsv = get_hsv(frames[frame_num - 1:frame_num + 1])
+        score = get_content_scores(hsv[1:], hsv[:-1])[0]
+        if score >= threshold:
+            frame_nums.append(int(frame_num))
+            cut_scores.append(float(score))
+    return frame_nums, cut_scores
+
+
+def _get_cut_candidates(store_path, start, end, threshold, step, candidate_ratio):
+    # runs get_cut_candidates on a chunk of the video inside a worker process
+    if store_path not in _stores:
+        _stores[store_path] = FrameStore(store_path)
+    return get_cut_candidates(_stores[store_path].frames, start, end, threshold, step, candidate_ratio)
+
+
+def filter_cuts(frame_nums, min_scene_len=MIN_SCENE_LEN):
+    """
+    :param frame_nums: sorted frame numbers scoring over the threshold
+    :return: cutting_list, the frames that start a new shot: a frame over the threshold is only a cut if the previous
+    shot is long enough, as in ContentDetector
+    """
+    cutting_list = []
+    last_cut = 0
+    for frame_num in frame_nums:
+        if frame_num - last_cut >= min_scene_len:
+            cutting_list.append(frame_num)
+            last_cut = frame_num
+    return cutting_list
+
+
+def detect_cuts(store, threshold=SCENE_THRESHOLD, min_scene_len=MIN_SCENE_LEN, approximate=False,
+                candidate_ratio=CANDIDATE_RATIO, workers=1, chunk_frames=1000, progress=None):
+    """
+    Detects shot boundaries like PySceneDetect's ContentDetector(threshold, min_scene_len) does, frame by frame, but
+    on batches of frames and optionally in several processes, with the same cuts. Each process gets a chunk of frames
+    plus the frame before it, so no cut is missed at the chunk boundaries.
+    :param store: FrameStore of the video
+    :param approximate: find the candidate cuts with a faster subsampled pass first, see get_cut_candidates. Cuts
+    whose changes fall between the sampled pixels are missed, so the cuts can differ from ContentDetector's
+    :param workers: number of processes, 1 to detect in the current process
+    :param progress: optional callback receiving the number of frames processed so far, detection stops if it raises
+    :return: cutting_list, the frame numbers where new shots start
+    """
+    frame_count = len(store)
+    step = get_coarse_step(store.frames.shape[2]) if approximate else 1
+    chunks = [(chunk_start, min(chunk_start + chunk_frames, frame_count))
+              for chunk_start in range(0, frame_count, chunk_frames)]
+    frame_nums = []
+    if workers > 1 and len(chunks) > 1:
+        # forking a process that already loaded numba/scipy can deadlock, start clean interpreters instead
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = [executor.submit(_get_cut_candidates, store.path, chunk_start, chunk_end, threshold, step,
+                                       candidate_ratio) for chunk_start, chunk_end in chunks]
+            try:
+                # chunks are collected in order so that the cuts stay sorted
+                for future, (chunk_start, chunk_end) in zip(futures, chunks):
+                    frame_nums += future.result()[0]
+                    if progress is not None:
+                        progress(chunk_end)
+            except BaseException:
+                # e.g. cancelled from the progress callback, drop the chunks that have not started yet
+                for future in futures:
+                    future.cancel()
+                raise
+    else:
+        for chunk_start, chunk_end in chunks:
+            frame_nums += get_cut_candidates(store.frames, chunk_start, chunk_end, threshold, step,
+                                             candidate_ratio)[0]
+            if progress is not None:
+                progress(chunk_end)
+    return filter_cuts(frame_nums, min_scene_len)
+
+
+class CutDetector:
+    """
+    Frame by frame counterpart of detect_cuts, with the same process_frame/post_process interface as PySceneDetect's
+    ContentDetector and the same cuts as both, for engines reading the frames one at a time
+    """
+
+    def __init__(self, threshold=SCENE_THRESHOLD, min_scene_len=MIN_SCENE_LEN):
+        self.threshold = threshold
+        self.min_scene_len = min_scene_len
+        self.last_hsv = None
+        self.last_cut = 0
+
+    def process_frame(self, frame_num, frame_img):
+        """
+        :param frame_img: (height, width, 3) frame, frames must be passed in order from frame 0
+        :return: list of the cuts detected at this frame, i.e. [frame_num] or []
+        """
+        hsv = get_hsv(frame_img[np.newaxis])
+        last_hsv = self.last_hsv
+        self.last_hsv = hsv
+        if last_hsv is None:
+            return []
+        if get_content_scores(hsv, last_hsv)[0] >= self.threshold and frame_num - self.last_cut >= self.min_scene_len:
+            self.last_cut = frame_num
+            return [frame_num]
+        return []
+
+    def post_process(self, frame_num):
+        return []
+
+
+def detect_cuts_pyscenedetect(store, threshold=SCENE_THRESHOLD, min_scene_len=MIN_SCENE_LEN):
+    """
+    Reference implementation, feeding every frame to PySceneDetect's ContentDetector
+    :return: cutting_list
+    """
+    from scenedetect.detectors import ContentDetector
+
+    detector = ContentDetector(threshold=threshold, min_scene_len=min_scene_len)
+    cutting_list = []
+    frame_num = 0
+    for frame_img in store:
+        cutting_list += detector.process_frame(frame_num, frame_img)
+        frame_num += 1
+    return cutting_list + detector.post_process(frame_num)
+
+
+if __name__ == "__main__":
+    # compare with PySceneDetect on a video: ./scene_detection.py <rgb folder> [workers]
+    store = FrameStore.open(sys.argv[1])
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    start = time.perf_counter()
+    expected = detect_cuts_pyscenedetect(store)
+    reference_seconds = time.perf_counter() - start
+    print('PySceneDetect: {cuts} cuts in {seconds:.2f}s ({fps:.0f} frames/s)'.format(
+        cuts=len(expected), seconds=reference_seconds, fps=len(store) / reference_seconds))
+    identical = True
+    for name, approximate in (('batched', False), ('approximate', True)):
+        start = time.perf_counter()
+        cutting_list = detect_cuts(store, approximate=approximate, workers=workers)
+        seconds = time.perf_counter() - start
+        print('{name}: {cuts} cuts in {seconds:.2f}s ({fps:.0f} frames/s), {same}'.format(
+            name=name, cuts=len(cutting_list), seconds=seconds, fps=len(store) / seconds,
+            same='identical cuts' if cutting_list == expected else 'DIFFERENT cuts'))
+        # only the exact detection has to match
+        identical = identical and (approximate or cutting_list == expected)
+    sys.exit(0 if identical else 1)
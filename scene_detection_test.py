@@ -0,0 +1,92 @@
+import numpy as np
+
+from scene_detection import CutDetector, detect_cuts, detect_cuts_pyscenedetect
+
+WIDTH = 320
+HEIGHT = 180
+
+
+class FrameArray:
+    """
+    Frames held in memory, with the parts of the FrameStore interface the detectors use
+    """
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        return iter(self.frames)
+
+
+def get_image(seed):
+    return np.random.RandomState(seed).randint(0, 256, (HEIGHT, WIDTH, 3)).astype(np.uint8)
+
+
+def get_frames(images, frame_count=40):
+    """
+    :param images: dictionary of the frame number every image starts at
+    """
+    frames = np.empty((frame_count, HEIGHT, WIDTH, 3), dtype=np.uint8)
+    for frame_num, image in sorted(images.items()):
+        frames[frame_num:] = image
+    return FrameArray(frames)
+
+
+def get_off_grid_frames():
+    # rows 1, 2 and 3 mod 4 change at frame 20, the rows sampled by the approximate detection do not
+    changed = get_image(0).copy()
+    changed[np.arange(HEIGHT) % 4 != 0] = get_image(1)[np.arange(HEIGHT) % 4 != 0]
+    return get_frames({0: get_image(0), 20: changed})
+
+
+def get_adversarial_videos():
+    off_grid_columns = get_image(2).copy()
+    off_grid_columns[:, np.arange(WIDTH) % 4 != 0] = get_image(3)[:, np.arange(WIDTH) % 4 != 0]
+    # a single changed row, far below the threshold
+    single_row = get_image(4).copy()
+    single_row[7] = get_image(5)[7]
+    # brightness changes scoring just below and exactly at the threshold
+    gray = np.full((HEIGHT, WIDTH, 3), 100, dtype=np.uint8)
+    return {
+        'off grid rows': get_off_grid_frames(),
+        'off grid columns': get_frames({0: get_image(2), 20: off_grid_columns}),
+        'cut before the minimum scene length': get_frames({0: get_image(6), 1: get_image(7)}),
+        'cuts closer than the minimum scene length': get_frames({0: get_image(8), 10: get_image(9), 13: get_image(10),
+                                                                 30: get_image(11)}),
+        'single row': get_frames({0: get_image(4), 15: single_row}),
+        'near threshold': get_frames({0: gray, 10: gray + 89, 20: gray, 30: gray + 90}),
+        'noise': FrameArray(np.random.RandomState(12).randint(0, 256, (40, HEIGHT, WIDTH, 3)).astype(np.uint8)),
+    }
+
+
+def detect_cuts_frame_by_frame(store):
+    detector = CutDetector()
+    cutting_list = []
+    for frame_num, frame_img in enumerate(store):
+        cutting_list += detector.process_frame(frame_num, frame_img)
+    return cutting_list + detector.post_process(len(store))
+
+
+def test_detect_cuts_matches_pyscenedetect():
+    for name, store in get_adversarial_videos().items():
+        expected = detect_cuts_pyscenedetect(store)
+        assert detect_cuts(store) == expected, name
+        # chunks of a few frames, so that cuts fall on chunk boundaries
+        assert detect_cuts(store, chunk_frames=7) == expected, name
+        assert detect_cuts_frame_by_frame(store) == expected, name
+
+
+def test_off_grid_cut():
+    store = get_off_grid_frames()
+    assert detect_cuts_pyscenedetect(store) == [20]
+    assert detect_cuts(store) == [20]
+    # the subsampled pass never sees the change, hence approximate
+    assert detect_cuts(store, approximate=True) == []
+
+
+if __name__ == "__main__":
+    test_detect_cuts_matches_pyscenedetect()
+    test_off_grid_cut()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+
+import numpy as np
+
+from instrumentation import NULL_INSTRUMENTATION
+from selection import get_clips, select_clips
+
+
+class ScoringConfig:
+    """
+    Parameters turning the raw features of the shots (motion, audio, faces) into shot scores, candidate clips and
+    summaries. None of them affects the features, so changing them never requires evaluating the video again.
+
+    Configurations are not modified once created, use replace() to derive a new one.
+    """
+    # parameters read by each scoring stage, see ScoringEngine
+    SHOT_SCORE_PARAMS = ('audio_boost', 'face_detection_bonus')
+    CLIP_PARAMS = ('min_clip_seconds', 'max_clip_seconds', 'clip_seconds', 'trim_factor', 'smoothing')
+    SUMMARY_PARAMS = ('summary_seconds',)
+
+    def __init__(self, audio_boost=1.5, face_detection_bonus=1.2, min_clip_seconds=1.5, max_clip_seconds=10,
+                 clip_seconds=9, trim_factor=.3, smoothing=1, summary_seconds=89):
+        # multiplier of the shots louder than average
+        self.audio_boost = audio_boost
+        # multiplier of the shots with a face
+        self.face_detection_bonus = face_detection_bonus
+        # shots shorter than this are left out of the summaries, they look abrupt
+        self.min_clip_seconds = min_clip_seconds
+        # shots shorter than this are taken whole
+        self.max_clip_seconds = max_clip_seconds
+        # length of the clips taken from longer shots
+        self.clip_seconds = clip_seconds
+        # frames at the edges of a clip with less motion than this fraction of the shot score are left out
+        self.trim_factor = trim_factor
+        # number of motion scores averaged before looking for the clip of a long shot
+        self.smoothing = smoothing
+        # default length of a summary
+        self.summary_seconds = summary_seconds
+
+    def __repr__(self):
+        params = ', '.join('{name}={value!r}'.format(name=name, value=value) for name, value in self.to_dict().items())
+        return 'ScoringConfig({params})'.format(params=params)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.SHOT_SCORE_PARAMS + self.CLIP_PARAMS + self.SUMMARY_PARAMS}
+
+    def replace(self, **changes):
+        """
+        :return: copy of the configuration with some parameters changed, e.g. config.replace(audio_boost=2.)
+        """
+        params = self.to_dict()
+        for name in changes:
+            if name not in params:
+                raise ValueError('Unknown scoring parameter {name}, expected one of: {params}'.format(
+                    name=name, params=', '.join(params)))
+        params.update(changes)
+        return ScoringConfig(**params)
+
+    def get_key(self, params):
+        return tuple(getattr(self, name) for name in params)
+
+
+DEFAULT_SCORING_CONFIG = ScoringConfig()
+
+
+class ScoringEngine:
+    """
+    Recomputes the scoring stages of evaluated shots when the scoring configuration changes, and only those.
+
+    The stages depend on each other as features -> shot scores -> clips -> summaries. The result of every stage is
+    kept under the values of the parameters it depends on (its own and those of the stages before it), so a new
+    configuration only recomputes the stages whose parameters changed: changing the audio boost rescores the shots but
+    reuses the features, changing the clip length reuses the shot scores, and going back to a configuration seen before
+    recomputes nothing. The features themselves are never recomputed, which makes sweeping hundreds of configurations
+    over a video a matter of seconds.
+    """
+
+    def __init__(self, shots, instrumentation=None):
+        """
+        :param shots: ShotTable whose motion, audio (normalized) and face features are evaluated
+        :param instrumentation: optional Instrumentation counting the stages recomputed
+        """
+        self.shots = shots
+        self.instrumentation = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
+        self.avg_audio_score = float(np.average(shots.rows['audio_score'])) if len(shots) else 0.
+        # results of each stage, keyed by the parameters they depend on
+        self.shot_scores = {}
+        self.clips = {}
+        self.summaries = {}
+
+    def get_shot_scores(self, config=DEFAULT_SCORING_CONFIG):
+        """
+        Scores the shots with the given configuration, the scores are written to the shot_score column of the table
+        :return: (shots,) array of shot scores
+        """
+        key = config.get_key(ScoringConfig.SHOT_SCORE_PARAMS)
+        if key not in self.shot_scores:
+            self.shots.get_shot_scores(self.avg_audio_score, config)
+            self.shot_scores[key] = self.shots.rows['shot_score'].copy()
+            self.instrumentation.count('shot_scores_computed', 1)
+        else:
+            self.shots.rows['shot_score'] = self.shot_scores[key]
+        return self.shot_scores[key]
+
+    def get_clips(self, config=DEFAULT_SCORING_CONFIG):
+        """
+        :return: candidate clip of every shot, see selection.get_clips
+        """
+        # the clips are trimmed relative to the shot scores, so the table has to hold the scores of this configuration
+        self.get_shot_scores(config)
+        key = config.get_key(ScoringConfig.SHOT_SCORE_PARAMS + ScoringConfig.CLIP_PARAMS)
+        if key not in self.clips:
+            self.clips[key] = get_clips(self.shots, config)
+            self.instrumentation.count('clips_computed', 1)
+        return self.clips[key]
+
+    def select(self, seconds=None, config=DEFAULT_SCORING_CONFIG):
+        """
+        Selects the frames of summaries of the given lengths, see selection.select_clips
+        :param seconds: lengths of the summaries in seconds, the configuration's summary length by default
+        :return: dictionary of length to the list of (start, end) frame numbers of the summary, sorted
+        """
+        seconds = tuple(seconds) if seconds is not None else (config.summary_seconds,)
+        clips = self.get_clips(config)
+        key = config.get_key(ScoringConfig.SHOT_SCORE_PARAMS + ScoringConfig.CLIP_PARAMS) + (seconds,)
+        if key not in self.summaries:
+            fps = self.shots.fps
+            budgets = {length: int(round(length * fps)) for length in seconds}
+            selections = select_clips(clips, list(budgets.values()), int(round(config.min_clip_seconds * fps)))
+            self.summaries[key] = {length: selections[budget] for length, budget in budgets.items()}
+            self.instrumentation.count('summaries_computed', 1)
+        return self.summaries[key]
+
+    def sweep(self, configs, seconds=None):
+        """
+        Selects the summaries of many configurations, e.g. a grid of weights
+        :return: list of the select() result of each configuration
+        """
+        return [self.select(seconds, config) for config in configs]
+
+
+if __name__ == "__main__":
+    # sweep a grid of shot score weights over a video: ./scoring.py <rgb folder> <wav file>
+    from analysis_cache import AnalysisCache
+    from evaluator import Evaluator
+
+    evaluator = Evaluator(sys.argv[1], sys.argv[2], None, cache=AnalysisCache())
+    evaluator.evaluate()
+    configs = [DEFAULT_SCORING_CONFIG.replace(audio_boost=audio_boost, face_detection_bonus=face_detection_bonus,
+                                              clip_seconds=clip_seconds)
+               for audio_boost in np.linspace(1., 3., 11)
+               for face_detection_bonus in np.linspace(1., 2., 6)
+               for clip_seconds in (6, 9, 12)]
+    start = time.perf_counter()
+    summaries = evaluator.get_scoring().sweep(configs)
+    elapsed = time.perf_counter() - start
+    distinct = len(set(tuple(map(tuple, summary[DEFAULT_SCORING_CONFIG.summary_seconds])) for summary in summaries))
+    print('{configs} configurations in {seconds:.2f}s, {distinct} distinct summaries'.format(
+        configs=len(configs), seconds=elapsed, distinct=distinct))
@@ -0,0 +1,80 @@
+import numpy as np
+
+# shortest clip of a summary, shorter clips look abrupt
+MIN_CLIP_FRAMES = 45
+
+
+def get_clips(shots, config=None):
+    """
+    Returns the candidate clip of every shot, see Shot.get_frames_with_highest_score
+    :param config: ScoringConfig with the clip lengths, the default one if None
+    :return: list of (shot score, start, end), shots without a clip are left out
+    """
+    clips = []
+    for shot in shots:
+        start, end = shot.get_frames_with_highest_score(config)
+        if start is not None:
+            clips.append((shot.shot_score, start, end))
+    return clips
+
+
+def select_clips(clips, budgets, min_frames=MIN_CLIP_FRAMES):
+    """
+    Picks the clips of a summary for each budget, maximizing the sum of the clips' scores times their length.
+
+    Clips can be trimmed down to min_frames (around their middle), so a summary is exactly as long as its budget
+    unless all the clips together are shorter. This is a knapsack problem solved by dynamic programming over the
+    number of frames: best[w] is the best total score of w frames. With a score per frame, adding a clip of length
+    a..b to best is a sliding window maximum, which keeps every step linear in the largest budget. The table of
+    every step is kept, so any budget up to the largest one is read from the same run.
+    :param clips: list of (score per frame, start, end)
+    :param budgets: lengths of the summaries in frames
+    :param min_frames: shortest clip length
+    :return: dictionary of budget to the selected (start, end) frame numbers, sorted by start
+    """
+    max_budget = max(budgets)
+    frame_counts = np.arange(max_budget + 1)
+    best = np.full(max_budget + 1, -np.inf)
+    # SciPy takes a while to import, and only the summaries need it
+    from scipy import ndimage
+
+    best[0] = 0.
+    steps = []
+    for score, start, end in clips:
+        longest = min(end - start, max_budget)
+        shortest = min(min_frames, end - start)
+        if shortest > max_budget:
+            continue
+        # best[w] with a clip of length l: best[w - l] + score * l = (best[j] - score * j) + score * w, j = w - l
+        offsets = best - score * frame_counts
+        padded = np.concatenate((np.full(longest, -np.inf), offsets))
+        size = longest - shortest + 1
+        # window_max[w] = max(offsets[w - longest:w - shortest + 1])
+        window_max = ndimage.maximum_filter1d(padded, size, mode='constant', cval=-np.inf)[
+            size // 2:size // 2 + max_budget + 1]
+        previous = best
+        best = np.maximum(previous, window_max + score * frame_counts)
+        steps.append((score, start, end, shortest, longest, previous))
+
+    selections = {}
+    for budget in budgets:
+        # longest summary with the best score
+        frames = int(np.flatnonzero(best[:budget + 1] == np.max(best[:budget + 1]))[-1])
+        selection = []
+        for score, start, end, shortest, longest, previous in reversed(steps):
+            if frames < shortest:
+                continue
+            # recompute this step's transition for a single frame count
+            first = max(frames - longest, 0)
+            last = frames - shortest
+            offsets = previous[first:last + 1] - score * frame_counts[first:last + 1]
+            idx = int(np.argmax(offsets))
+            if offsets[idx] + score * frames > previous[frames]:
+                length = frames - (first + idx)
+                # trim the clip around its middle
+                clip_start = start + (end - start - length) // 2
+                selection.append((clip_start, clip_start + length))
+                frames -= length
+        selection.sort(key=lambda x: x[0])
+        selections[budget] = selection
+    return selections
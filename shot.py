@@ -1,60 +1,254 @@
-from collections import OrderedDict
+import numpy as np
+
+from scoring import DEFAULT_SCORING_CONFIG
+from video_metadata import DEFAULT_FPS
+from windows import top_windows
+
+# columns of a ShotTable, scores are NaN until they are computed
+SHOT_DTYPE = np.dtype([
+    ('num', np.int64),
+    ('start', np.int64),
+    ('end', np.int64),
+    # number of motion scores of the shot in ShotTable.motion, 0 until the motion is evaluated
+    ('motion_count', np.int64),
+    ('motion_score', np.float64),
+    ('audio_score', np.float64),
+    ('face_detected', np.bool_),
+    ('shot_score', np.float64),
+])
+
+
+def _column(name, kind):
+    # property reading and writing one column of the shot's row, float columns read NaN as None
+    def get(self):
+        value = self.table.rows[name][self.row]
+        if kind is float:
+            return None if np.isnan(value) else float(value)
+        return kind(value)
+
+    def set(self, value):
+        self.table.rows[name][self.row] = np.nan if value is None else value
+
+    return property(get, set)
 
 
 class Shot:
+    """
+    A shot, stored as a row of a ShotTable.
+
+    Shots created on their own (e.g. Shot(num=0, start=0, end=100)) get a table of their own, the shots of a video are
+    views of the video's ShotTable. Both are used the same way.
+    """
+    __slots__ = ('table', 'row')
+
+    # shot number
+    num = _column('num', int)
+    # frame number of start of shot
+    start = _column('start', int)
+    # frame number of end of shot (non-inclusive)
+    end = _column('end', int)
+    # average motion score of the entire shot
+    motion_score = _column('motion_score', float)
+    # average audio score of the entire shot
+    audio_score = _column('audio_score', float)
+    # is a face detected in this shot?
+    face_detected = _column('face_detected', bool)
+    # score of the entire shot based on some combination of the motion/audio/other scores
+    shot_score = _column('shot_score', float)
+
     def __init__(self, num, start, end, motion_scores=None, audio_scores=None):
-        # shot number
-        self.num = num
-        # frame number of start of shot
-        self.start = start
-        # frame number of end of shot (non-inclusive)
-        self.end = end
-        # dictionary of frame sequences and their individual motion scores in this format: {'0_1': 5.0, '1_2':5.0...}
-        self.motion_scores = motion_scores
-        # average motion score of the entire shot
-        self.motion_score = None
-        # average audio score of the entire shot
-        self.audio_score = None
-        # is a face detected in this shot?
-        self.face_detected = False
-        # score of the entire shot based on some combination of the motion/audio/other scores
-        self.shot_score = None
-
-    def get_shot_score(self, avg_audio_score):
-        audio_boost = 1.5 if self.audio_score > avg_audio_score else 1.
-        face_detection_bonus = 1.2 if self.face_detected else 1.
+        self.table = ShotTable([start], [end], nums=[num])
+        self.row = 0
+        if motion_scores is not None:
+            self.motion_scores = motion_scores
+
+    @classmethod
+    def view(cls, table, row):
+        shot = cls.__new__(cls)
+        shot.table = table
+        shot.row = row
+        return shot
+
+    @property
+    def motion_scores(self):
+        """
+        Motion scores between consecutive frames in this format: {'0_1': 5.0, '1_2':5.0...}. Kept for compatibility,
+        get_motion_score_array() does not build a dictionary.
+        """
+        if not self.table.rows['motion_count'][self.row]:
+            return None
+        start = self.start
+        return {str(start + idx) + '_' + str(start + idx + 1): float(score)
+                for idx, score in enumerate(self.get_motion_score_array())}
+
+    @motion_scores.setter
+    def motion_scores(self, motion_scores):
+        # array of the motion scores between consecutive frames, or a dictionary in the format above
+        if isinstance(motion_scores, dict):
+            motion_scores = list(motion_scores.values())
+        self.table.set_motion_scores(self.row, motion_scores)
+
+    def get_shot_score(self, avg_audio_score, config=DEFAULT_SCORING_CONFIG):
+        """
+        :param config: ScoringConfig with the weights of the audio and face features
+        """
+        audio_boost = config.audio_boost if self.audio_score > avg_audio_score else 1.
+        face_detection_bonus = config.face_detection_bonus if self.face_detected else 1.
         self.shot_score = self.motion_score * audio_boost * face_detection_bonus
 
     def get_motion_score(self):
-        assert self.motion_scores is not None
-        return sum(self.motion_scores.values()) / len(self.motion_scores.keys())
+        motion_scores = self.get_motion_score_array()
+        assert len(motion_scores)
+        return float(np.mean(motion_scores, dtype=np.float64))
 
-    def get_frames_with_highest_score(self):
+    def get_motion_score_array(self):
+        """
+        :return: float32 view of the motion scores between consecutive frames, the i-th one being between frames
+        start + i and start + i + 1
+        """
+        return self.table.get_motion_scores(self.row)
+
+    def get_frames_with_highest_score(self, config=None):
         """
         Returns the start and end frame numbers of the highest scored frames in the shot
+        :param config: ScoringConfig with the clip lengths, the default one if None
         :return: (start_frame, end_frame)
         """
         assert self.shot_score is not None
+        config = config if config is not None else DEFAULT_SCORING_CONFIG
 
         if self.shot_score == 0.:
             return None, None
 
+        fps = self.table.fps
         # if the shot is very short, it might not make sense and look abrupt
-        if self.end - self.start < 45:
+        if self.end - self.start < int(round(config.min_clip_seconds * fps)):
             return None, None
 
         # 10s is the maximum summarized shot length
-        if self.end - self.start < 300:
+        if self.end - self.start < int(round(config.max_clip_seconds * fps)):
             return self.start, self.end
 
-        motion_scores_sorted = OrderedDict(sorted(self.motion_scores.items(), key=lambda item: item[1], reverse=True))
-        frame_nums = set()
-        for key, value in motion_scores_sorted.items():
-            if frame_nums and max(frame_nums) - min(frame_nums) >= 270:
-                break
-            if value <= .3 * self.shot_score:
-                break
-            frame_nums.add(int(key.split('_')[0]))
-            frame_nums.add(int(key.split('_')[1]))
-
-        return min(frame_nums), max(frame_nums)
+        return self.get_top_windows(1, config=config)[0]
+
+    def get_top_windows(self, k, length=None, config=DEFAULT_SCORING_CONFIG):
+        """
+        Returns up to k non-overlapping windows of the shot with the most motion, in O(k * shot length). Frames with
+        little motion (30% of the shot score or less by default) at the edges of a window are left out.
+        :param k: maximum number of windows
+        :param length: length of the windows in frames, the configuration's clip length by default
+        :param config: ScoringConfig with the clip length, trim factor and smoothing
+        :return: list of (start_frame, end_frame), sorted
+        """
+        if length is None:
+            length = int(round(config.clip_seconds * self.table.fps))
+        motion_scores = self.get_motion_score_array()
+        windows = []
+        for start, end in top_windows(motion_scores, length, k, config.smoothing):
+            # trim the quiet frames at the edges of the window, unless the whole window is quiet
+            active = np.flatnonzero(motion_scores[start:end] > config.trim_factor * self.shot_score)
+            if len(active):
+                start, end = start + active[0], start + active[-1] + 1
+            windows.append((self.start + int(start), self.start + int(end)))
+        return windows
+
+
+class ShotTable:
+    """
+    Columnar storage of the shots of a video.
+
+    Each shot is a row of a structured array (see SHOT_DTYPE), and the motion scores between consecutive frames of all
+    the shots are kept in a single float32 array indexed by frame number: motion[frame - motion_offset] is the score
+    between frame and frame + 1. Indexing or iterating the table gives Shot views, so code written against a list of
+    Shot keeps working, while scoring and selection can work on whole columns at once.
+    """
+
+    def __init__(self, starts, ends, nums=None, motion_offset=None, fps=DEFAULT_FPS):
+        """
+        :param starts: frame number of the start of each shot
+        :param ends: frame number of the end of each shot (non-inclusive)
+        :param nums: shot numbers, 0 to len(starts) - 1 by default
+        :param motion_offset: frame number of motion[0], the start of the first shot by default
+        :param fps: frame rate of the video, clip lengths are given in seconds
+        """
+        self.fps = fps
+        self.rows = np.zeros(len(starts), dtype=SHOT_DTYPE)
+        self.rows['num'] = np.arange(len(starts)) if nums is None else nums
+        self.rows['start'] = starts
+        self.rows['end'] = ends
+        for name in ('motion_score', 'audio_score', 'shot_score'):
+            self.rows[name] = np.nan
+        if motion_offset is None:
+            motion_offset = int(self.rows['start'].min()) if len(self.rows) else 0
+        self.motion_offset = motion_offset
+        motion_length = int(self.rows['end'].max()) - motion_offset if len(self.rows) else 0
+        self.motion = np.zeros(max(motion_length, 0), dtype=np.float32)
+
+    @classmethod
+    def from_cuts(cls, cutting_list, frame_count, fps=DEFAULT_FPS):
+        """
+        :param cutting_list: frame numbers where shots start, as returned by the scene detector
+        :param frame_count: number of frames of the video, the last shot ends there
+        """
+        starts = [0] + [cut for cut in cutting_list if cut < frame_count]
+        ends = starts[1:] + [frame_count]
+        return cls(starts, ends, fps=fps)
+
+    @classmethod
+    def from_shots(cls, shots, fps=DEFAULT_FPS):
+        """
+        Gathers shots (e.g. created on their own) into a single table
+        """
+        table = cls([shot.start for shot in shots], [shot.end for shot in shots], [shot.num for shot in shots],
+                    fps=fps)
+        for row, shot in enumerate(shots):
+            table.rows[row] = shot.table.rows[shot.row]
+            table.rows['motion_count'][row] = 0
+            if shot.table.rows['motion_count'][shot.row]:
+                table.set_motion_scores(row, shot.get_motion_score_array())
+        return table
+
+    @classmethod
+    def from_arrays(cls, rows, motion, motion_offset, fps=DEFAULT_FPS):
+        # restores a table from its columns, e.g. loaded from the analysis cache
+        table = cls.__new__(cls)
+        table.fps = fps
+        table.rows = np.asarray(rows, dtype=SHOT_DTYPE)
+        table.motion = np.asarray(motion, dtype=np.float32)
+        table.motion_offset = int(motion_offset)
+        return table
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self.rows)
+        if not 0 <= row < len(self.rows):
+            raise IndexError('shot index out of range')
+        return Shot.view(self, row)
+
+    def __iter__(self):
+        for row in range(len(self.rows)):
+            yield Shot.view(self, row)
+
+    def get_motion_scores(self, row):
+        start = self.rows['start'][row] - self.motion_offset
+        return self.motion[start:start + self.rows['motion_count'][row]]
+
+    def set_motion_scores(self, row, motion_scores):
+        """
+        :param motion_scores: motion scores between consecutive frames of the shot, at most end - start of them
+        """
+        start = self.rows['start'][row] - self.motion_offset
+        assert len(motion_scores) <= self.rows['end'][row] - self.rows['start'][row]
+        self.motion[start:start + len(motion_scores)] = motion_scores
+        self.rows['motion_count'][row] = len(motion_scores)
+
+    def get_shot_scores(self, avg_audio_score, config=DEFAULT_SCORING_CONFIG):
+        """
+        Shot.get_shot_score of every shot at once
+        """
+        audio_boost = np.where(self.rows['audio_score'] > avg_audio_score, config.audio_boost, 1.)
+        face_detection_bonus = np.where(self.rows['face_detected'], config.face_detection_bonus, 1.)
+        self.rows['shot_score'] = self.rows['motion_score'] * audio_boost * face_detection_bonus
@@ -0,0 +1,84 @@
+import numpy as np
+
+from evaluator import Evaluator
+from frame_store import iter_frames
+from scene_detection import MIN_SCENE_LEN, SCENE_THRESHOLD, CutDetector
+from shot import Shot, ShotTable
+
+
+class StreamingEvaluator(Evaluator):
+    """
+    Single-pass variant of Evaluator.
+
+    Frames are read one at a time and fed to the scene detector. As soon as a cut is emitted, the frames buffered since
+    the previous cut are evaluated as a shot and dropped, so peak memory is bounded by the longest shot rather than the
+    whole video. The resulting shots are the same as the ones produced by Evaluator.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # scene detection is part of the single pass done by evaluate()
+        super(StreamingEvaluator, self).__init__(*args, detect_scenes=False, **kwargs)
+
+    def read_frames(self):
+        frame_num = 0
+        for frame_img in iter_frames(self.rgb_folder, self.metadata.width, self.metadata.height):
+            yield frame_num, frame_img
+            frame_num += 1
+            if frame_num % 1000 == 0:
+                self.cancellation.check()
+                # counted in bulk to keep the per-frame overhead low
+                self.instrumentation.count('frames_decoded', 1000)
+                self.instrumentation.count('bytes_read', 1000 * frame_img.nbytes)
+                if self.signals is not None:
+                    self.signals.report_progress.emit((
+                        'Detecting and evaluating shots... {frame_num}/{frame_count} frames evaluated.'.format(
+                            frame_num=frame_num, frame_count=self.metadata.frame_count),
+                        frame_num / float(self.metadata.frame_count)))
+        if frame_num % 1000:
+            self.instrumentation.count('frames_decoded', frame_num % 1000)
+            self.instrumentation.count('bytes_read', frame_num % 1000 * frame_img.nbytes)
+
+    def segment_shots(self, frames):
+        """
+        Groups a stream of frames into shots
+        :param frames: iterable of (frame_num, frame)
+        :return: generator of (Shot, frames of the shot), yielded as soon as the shot's closing cut is detected
+        """
+        # same cuts as Evaluator.detect_scenes, see scene_detection.py
+        detector = CutDetector(threshold=SCENE_THRESHOLD, min_scene_len=MIN_SCENE_LEN)
+        self.cutting_list = []
+        buffer = []
+        start = 0
+        s = 0
+        frame_num = 0
+        for frame_num, frame_img in frames:
+            cuts = detector.process_frame(frame_num, frame_img)
+            for cut in cuts:
+                self.cutting_list.append(cut)
+                yield Shot(num=s, start=start, end=cut), np.array(buffer[:cut - start])
+                buffer = buffer[cut - start:]
+                start = cut
+                s += 1
+            buffer.append(frame_img)
+            frame_num += 1
+        cuts = detector.post_process(frame_num)
+        self.cutting_list += cuts
+        for cut in cuts:
+            yield Shot(num=s, start=start, end=cut), np.array(buffer[:cut - start])
+            buffer = buffer[cut - start:]
+            start = cut
+            s += 1
+        # close the last shot at the end of the video
+        if start < frame_num:
+            yield Shot(num=s, start=start, end=frame_num), np.array(buffer)
+
+    def evaluate_shots(self):
+        # param for audio evaluation
+        audio_energy = self.get_audio_energy()
+
+        shots = []
+        for shot, shot_frames in self.segment_shots(self.read_frames()):
+            self.cancellation.check()
+            self.evaluate_shot(shot, shot_frames, audio_energy)
+            shots.append(shot)
+        self.shots = ShotTable.from_shots(shots, self.metadata.fps)
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+
+from export import FRAME_NAME
+
+
+class Timeline:
+    """
+    Virtual timeline of a summary: its selections of the original video, played one after the other.
+
+    Positions on the timeline are frame numbers of the summary, from 0 to len(timeline). Nothing is copied or written:
+    the timeline maps every position to its frame of the original video, so a player can seek to any position of the
+    summary, or jump from one selection (segment) to the next, by reading the original frames and audio directly.
+    """
+
+    def __init__(self, selections, fps):
+        """
+        :param selections: (start, end) frame numbers of the original video, end non-inclusive, e.g. the result of
+        Evaluator.select_frames
+        :param fps: frame rate of the video
+        """
+        selections = np.asarray(selections, dtype=np.int64).reshape(-1, 2)
+        self.starts = selections[:, 0]
+        self.ends = selections[:, 1]
+        self.fps = fps
+        # position of the first frame of every segment, and the length of the timeline
+        self.offsets = np.concatenate(([0], np.cumsum(self.ends - self.starts)))
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    @property
+    def selections(self):
+        return [(int(start), int(end)) for start, end in zip(self.starts, self.ends)]
+
+    @property
+    def segment_starts(self):
+        # position of the first frame of every segment
+        return self.offsets[:-1]
+
+    @property
+    def duration(self):
+        # seconds
+        return len(self) / float(self.fps)
+
+    def get_segment(self, position):
+        """
+        :param position: position on the timeline, or array of them
+        :return: index of the segment holding the position
+        """
+        return np.searchsorted(self.offsets, position, side='right') - 1
+
+    def get_frame_num(self, position):
+        """
+        :param position: position on the timeline, or array of them
+        :return: frame number of the original video shown at that position
+        """
+        segment = self.get_segment(position)
+        return self.starts[segment] + position - self.offsets[segment]
+
+    def get_position(self, frame_num):
+        """
+        :return: position on the timeline of a frame of the original video, None if it is not selected
+        """
+        segment = int(np.searchsorted(self.starts, frame_num, side='right')) - 1
+        if segment < 0 or frame_num >= self.ends[segment]:
+            return None
+        return int(self.offsets[segment] + frame_num - self.starts[segment])
+
+    def get_frame_paths(self, folder):
+        """
+        :param folder: folder of the original JPG frames
+        :return: path of the frame at every position of the timeline
+        """
+        return [os.path.join(folder, FRAME_NAME.format(num=num)) for num in self.get_frame_num(np.arange(len(self)))]
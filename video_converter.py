@@ -1,20 +1,27 @@
-import datetime
-import glob
 import os
-import shutil
-import time
+import subprocess
+import threading
 
 import cv2
 import ffmpeg
 import numpy as np
-import pygame
-import wavio
+
+from audio_assembly import AUDIO_FORMATS, assemble_audio, get_audio_views, get_wav_buffer, write_pcm, write_wav
+from export import DEFAULT_EXPORT_MODE, export_frames, get_frame_names, write_manifest
+from workspace import Workspace, publish
 
 
 class VideoConverter:
-    def __init__(self, selections, video_input, audio_samples, fps, audio_rate, audio_sampwidth):
+    """
+    Converts, exports and plays the selected frames of a video.
+
+    Every conversion works in its own temporary workspace and publishes its output atomically, so any number of
+    converters can run at once on a host, even with the same output paths.
+    """
+
+    def __init__(self, selections, video_input, audio_samples, fps, audio_rate, audio_sampwidth, workspace_root=None):
         # selection of frames
-        self.selections = np.array([list(x) for x in selections])
+        self.selections = np.array([list(x) for x in selections], dtype=np.int64).reshape(-1, 2)
         # folder containing jpg frames
         self.video_input = video_input
         # audio samples where we can construct wav file
@@ -25,201 +32,145 @@ class VideoConverter:
         self.audio_rate = audio_rate
         # sampling width of audio
         self.audio_sampwidth = audio_sampwidth
-        pygame.init()
-        # init font first because it takes 8 seconds
-        self.font = pygame.font.SysFont('Sans', 18)
-
-    def clear_files(self):
-        files = glob.glob('output/*')
-        for f in files:
-            os.remove(f)
+        # folder of the conversions' workspaces, e.g. a tmpfs mount, workspace.WORKSPACE_ROOT by default
+        self.workspace_root = workspace_root
 
     def get_file_names(self):
-        selections = []
-        for selection in self.selections:
-            for i in range(selection[0], selection[1]):
-                selections.append('frame' + str(i) + '.jpg')
-        self.selections = selections
+        # file names of the selected jpg frames, in order
+        return get_frame_names(self.selections)
+
+    def get_audio_views(self):
+        # audio samples of every selection, as views of the track
+        return get_audio_views(self.audio_samples, self.selections, self.audio_rate, self.fps)
+
+    def get_audio(self):
+        # audio track of the summary
+        return assemble_audio(self.audio_samples, self.selections, self.audio_rate, self.fps)
+
+    def get_wav_buffer(self):
+        # WAV file of the summary's audio, in memory
+        return get_wav_buffer(self.get_audio(), self.audio_rate, self.audio_sampwidth)
 
-    def convert_video(self):
+    def convert_video(self, path):
         frames = []
-        for filename in self.selections:
+        for filename in self.get_file_names():
             img = cv2.imread(self.video_input + filename)
             height, width, layers = img.shape
             frames.append(img)
-        out = cv2.VideoWriter('output/video.mp4',
-                              cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (width, height))
+        out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (width, height))
         for frame in frames:
             out.write(frame)
         out.release()
 
-    def construct_audio(self, path=None):
-        total_frames = np.sum(np.subtract(self.selections[:, 1], self.selections[:, 0]))
-        a = np.empty([total_frames * 1600, 2], dtype=np.int16)
-        i = 0
-        for selection in self.selections:
-            start = selection[0]
-            end = selection[1]
-            audio_slice = self.audio_samples[start * 1600:end * 1600]
-            a[i:i + len(audio_slice)] = audio_slice
-            i += len(audio_slice)
-        wavio.write("output/audio.wav" if path is None else path, a,
-                    self.audio_rate, sampwidth=self.audio_sampwidth)
-
-    def merge_audio(self):
-        video = ffmpeg.input('output/video.mp4')
-        audio = ffmpeg.input('output/audio.wav')
-        out = ffmpeg.output(video, audio, 'output/summarized_video.mp4')
-        out.run()
-
-    def offline_conversion(self, folder_path):
-        jpg_folder_path = folder_path + '/frames/'
-        if not os.path.exists(folder_path):
-            os.mkdir(folder_path)
-            os.mkdir(jpg_folder_path)
-        else:
-            shutil.rmtree(folder_path, ignore_errors=True)
-            os.mkdir(folder_path)
-            os.mkdir(jpg_folder_path)
-        # construct and convert the audio
-        self.construct_audio(folder_path + '/audio.wav')
-        # convert frame selections into file names
-        self.get_file_names()
-        # copy all selected frames into the frames folder
-        for filename in self.selections:
-            shutil.copy(self.video_input + filename, jpg_folder_path + filename)
-
-    def convert(self):
-        # delete all files in output folder
-        self.clear_files()
-        # construct and convert the audio
-        self.construct_audio()
-        # convert selected list of frame numbers to file names of the jpg frames
-        self.get_file_names()
-        # convert the frames to a video
-        self.convert_video()
-        # merge audio and video
-        self.merge_audio()
+    def construct_audio(self, path):
+        write_wav(path, self.get_audio(), self.audio_rate, self.audio_sampwidth)
+
+    def merge_audio(self, video_path, audio_buffer, path):
+        # the audio is piped to ffmpeg from memory
+        video = ffmpeg.input(video_path)
+        audio = ffmpeg.input('pipe:', format='wav')
+        out = ffmpeg.output(video, audio, path).overwrite_output()
+        out.run(input=audio_buffer.getvalue())
+
+    def offline_conversion(self, folder_path, mode=DEFAULT_EXPORT_MODE):
+        """
+        Exports the summary to a folder: its frames in folder_path/frames/ and its audio in folder_path/audio.wav. The
+        folder is built next to folder_path and replaces it once complete.
+        :param mode: how the frames are exported, one of export.EXPORT_MODES: hardlink, reflink or copy the frames,
+        auto to use the first of them that works, or manifest to only write the frame ranges and source folder to
+        folder_path/manifest.json, which VideoPlayer can play
+        :return: the mode used, i.e. the exporter chosen in auto mode
+        """
+        folder_path = os.path.abspath(folder_path)
+        # built on the same filesystem as the destination, so publishing it is a rename
+        prefix = '.{name}.'.format(name=os.path.basename(folder_path))
+        with Workspace(os.path.dirname(folder_path), prefix) as workspace:
+            summary_path = workspace.get_path('summary')
+            os.makedirs(summary_path)
+            # construct and convert the audio
+            self.construct_audio(summary_path + '/audio.wav')
+            if mode == 'manifest':
+                write_manifest(summary_path, self.video_input, self.selections, self.fps)
+            else:
+                jpg_folder_path = summary_path + '/frames/'
+                os.makedirs(jpg_folder_path)
+                # link, clone or copy all selected frames into the frames folder
+                mode = export_frames(get_frame_names(self.selections), self.video_input, jpg_folder_path, mode)
+            publish(summary_path, folder_path)
+        return mode
+
+    def stream_conversion(self, path):
+        """
+        Encodes the summarized video with a single ffmpeg process: decoded frames are written to its stdin and the
+        selected audio samples to a second pipe, one selection at a time, so neither the frames nor the audio are
+        held in memory or written to intermediate files.
+        """
+        if not len(self.selections):
+            raise ValueError('No frames are selected')
+        first_frame = cv2.imread(self.video_input + 'frame{num}.jpg'.format(num=self.selections[0][0]))
+        height, width, layers = first_frame.shape
+        audio_read_fd, audio_write_fd = os.pipe()
+        video = ffmpeg.input('pipe:', format='rawvideo', pix_fmt='bgr24', s='{width}x{height}'.format(
+            width=width, height=height), r=self.fps)
+        audio = ffmpeg.input('pipe:{fd}'.format(fd=audio_read_fd), format=AUDIO_FORMATS[self.audio_sampwidth],
+                             ar=self.audio_rate, ac=self.audio_samples.shape[1])
+        args = ffmpeg.output(video, audio, path, pix_fmt='yuv420p').overwrite_output().compile()
+        process = subprocess.Popen(args, stdin=subprocess.PIPE, pass_fds=(audio_read_fd,))
+        os.close(audio_read_fd)
+
+        # ffmpeg reads both inputs at once, feed the audio from another thread so that neither pipe blocks the other
+        audio_writer = threading.Thread(target=self.write_audio, args=(audio_write_fd,))
+        audio_writer.start()
+        try:
+            for start, end in self.selections:
+                for i in range(start, end):
+                    process.stdin.write(cv2.imread(self.video_input + 'frame{num}.jpg'.format(num=i)).tobytes())
+            process.stdin.close()
+        except BrokenPipeError:
+            # ffmpeg exited early, its error is reported below
+            pass
+        except BaseException:
+            # stop ffmpeg, which also unblocks the audio writer
+            process.kill()
+            raise
+        finally:
+            audio_writer.join()
+        if process.wait() != 0:
+            raise ffmpeg.Error('ffmpeg', None, None)
+
+    def write_audio(self, fd):
+        # writes the raw audio samples of the selections to a file descriptor, then closes it
+        with os.fdopen(fd, 'wb') as f:
+            try:
+                write_pcm(f, self.get_audio_views(), self.audio_sampwidth)
+            except BrokenPipeError:
+                pass
+
+    def convert(self, path='output/summarized_video.mp4', streaming=True):
+        """
+        Writes the summarized video to path. It is encoded in the converter's workspace and replaces path once complete
+        :param streaming: encode with a single ffmpeg process fed through pipes (POSIX only) instead of writing the
+        video to a temporary file first
+        """
+        with Workspace(self.workspace_root) as workspace:
+            # same extension as path, ffmpeg picks the container from it
+            video_path = workspace.get_path('summary' + os.path.splitext(path)[1])
+            if streaming and os.name == 'posix':
+                self.stream_conversion(video_path)
+            else:
+                # construct the audio in memory
+                audio_buffer = self.get_wav_buffer()
+                # convert the frames to a video
+                self.convert_video(workspace.get_path('video.mp4'))
+                # merge audio and video
+                self.merge_audio(workspace.get_path('video.mp4'), audio_buffer, video_path)
+            publish(video_path, path)
 
     # play audio and display frames with an interval
     def play(self):
+        # played straight from the jpg frames and the audio track, nothing is written to the output folder
+        from video_player import SummaryPlayer
 
-        self.construct_audio()
-        self.get_file_names()
-
-        pygame.mixer.init()
-        pygame.mixer.music.load("output/audio.wav")
-        # play once
-        pygame.mixer.music.play(0)
-
-        # display image
-        display_width = 320
-        display_height = 180
-
-        clock = pygame.time.Clock()
-        pause = False
-
-        gameDisplay = pygame.display.set_mode((display_width, display_height))
-        pygame.display.set_caption('Summarized Video')
-
-        x = 0
-        y = 0
-
-        folder = self.video_input
-
-        frame_num = 0
-
-        # control play speed
-        play_fps = self.fps
-        fps_step = 5
-        prev_fps_incr = False
-
-        start_time = time.time()
-        resized = False
-        total_video_time = datetime.timedelta(seconds=len(self.selections) / 30.)
-        hours, remainder = divmod(total_video_time.total_seconds(), 3600)
-        total_minutes, total_seconds = divmod(remainder, 60)
-        total_seconds = '{total_seconds:02d}'.format(total_seconds=int(total_seconds))
-        total_minutes = '{total_minutes:02d}'.format(total_minutes=int(total_minutes))
-        minutes = 0
-        seconds = 0
-        while frame_num < len(self.selections):
-            for event in pygame.event.get():
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_p:
-                        if pause:
-                            pause = False
-                            start_time += time.time() - start_pause
-                            if not pygame.mixer.music.get_busy():
-                                pygame.mixer.music.unpause()
-                        else:
-                            pause = True
-                            start_pause = time.time()
-                            if pygame.mixer.music.get_busy():
-                                pygame.mixer.music.pause()
-                elif event.type == pygame.VIDEORESIZE:
-                    w, h = pygame.display.get_surface().get_size()
-                    w = int(w / 16.) * 16
-                    h = int(w / 16 * 9)
-                    gameDisplay = pygame.display.set_mode((w, h), pygame.RESIZABLE)
-                    resized = True
-
-            if not pause:
-                if resized:
-                    img = pygame.image.load(folder + self.selections[frame_num])
-                    img = pygame.transform.scale(img, (w, h))
-                else:
-                    img = pygame.image.load(folder + self.selections[frame_num])
-                sprite = pygame.sprite.Sprite()
-                sprite.image = img
-                sprite.rect = img.get_rect()
-                if frame_num % 30 == 0 and frame_num > 0:
-                    seconds += 1
-                    if seconds == 60:
-                        seconds = 0
-                        minutes += 1
-                text = self.font.render(
-                    '{minutes:02d}:{seconds:02d}/{total_minutes}:{total_seconds}'.format(minutes=minutes,
-                                                                                         seconds=seconds,
-                                                                                         total_minutes=total_minutes,
-                                                                                         total_seconds=total_seconds),
-                    True, (255, 255, 0))
-                sprite.image.blit(text, sprite.rect)
-                group = pygame.sprite.Group()
-                group.add(sprite)
-                gameDisplay.blit(img, (x, y))
-
-                pygame.display.update()
-
-                # wait twice as long for every 100th frame to achieve 30 fps (33.33ms/frame), otherwise wait for 33ms
-                if frame_num % 100 != 0:
-                    clock.tick(play_fps)
-                else:
-                    clock.tick(play_fps / 2)
-
-                end_time = time.time()
-
-                # change fps if too fast/slow
-                if frame_num % 100 != 0:
-
-                    if end_time - start_time < 1 / 30.0 * frame_num:
-
-                        if prev_fps_incr:
-                            fps_step = 5
-                        else:
-                            fps_step = fps_step / 2
-                        play_fps -= fps_step
-                        prev_fps_incr = False
-
-                    elif end_time - start_time > 1 / 30.0 * frame_num:
-
-                        if not prev_fps_incr:
-                            fps_step = 5
-                        else:
-                            fps_step = fps_step / 2
-                        play_fps += fps_step
-                        prev_fps_incr = True
-
-                frame_num += 1
-
-        pygame.quit()
+        player = SummaryPlayer(self.selections, self.video_input, self.audio_samples, self.fps, self.audio_rate,
+                               self.audio_sampwidth)
+        player.play()
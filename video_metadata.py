@@ -0,0 +1,105 @@
+import math
+import os
+
+import numpy as np
+
+from frame_store import CHANNELS, FRAME_HEIGHT, FRAME_WIDTH, list_frame_files
+
+# frame rate of the project dataset, the .rgb frames do not record it
+DEFAULT_FPS = 30
+# aspect ratio assumed when the size of the frames is not given and they are not 320x180
+DEFAULT_ASPECT_RATIO = 16 / 9.
+
+
+def get_frame_size(frame_bytes, width=None, height=None):
+    """
+    Works out the resolution of planar RGB frames from their size in bytes, as the .rgb files have no header
+    :param frame_bytes: size of one frame file
+    :param width: known width, if any
+    :param height: known height, if any
+    :return: (width, height)
+    """
+    pixels = frame_bytes // CHANNELS
+    if width is None and height is None:
+        if pixels == FRAME_WIDTH * FRAME_HEIGHT:
+            return FRAME_WIDTH, FRAME_HEIGHT
+        width = int(round(math.sqrt(pixels * DEFAULT_ASPECT_RATIO)))
+    if width is None:
+        width = pixels // height
+    elif height is None:
+        height = pixels // width
+    if frame_bytes != CHANNELS * width * height:
+        raise ValueError('{frame_bytes} byte frames are not {width}x{height} planar RGB, pass their size'.format(
+            frame_bytes=frame_bytes, width=width, height=height))
+    return width, height
+
+
+def get_sample_index(frame_num, audio_rate, fps=DEFAULT_FPS):
+    """
+    Returns the first audio sample of a frame. Frames get rate / fps samples each, rounded to the closest sample when
+    that is not a whole number (e.g. 44100 Hz at 29.97 fps), so no drift builds up over long videos.
+    :param frame_num: frame number, or array of them
+    :return: int, or int64 array if frame_num is an array
+    """
+    sample = np.rint(np.asarray(frame_num, dtype=np.float64) * audio_rate / fps).astype(np.int64)
+    return int(sample) if sample.ndim == 0 else sample
+
+
+class VideoMetadata:
+    """
+    Length, resolution and frame rate of a video and the sampling rate of its audio.
+
+    Everything that depends on the video's dimensions (frame store layout, progress reports, the end of the last shot,
+    audio samples of a frame, lengths in seconds) reads them from here instead of assuming the project dataset.
+    """
+
+    def __init__(self, frame_count, width=FRAME_WIDTH, height=FRAME_HEIGHT, fps=DEFAULT_FPS, audio_rate=48000):
+        # number of frames of the video
+        self.frame_count = frame_count
+        # resolution of the frames
+        self.width = width
+        self.height = height
+        # frames per second
+        self.fps = fps
+        # audio samples per second
+        self.audio_rate = audio_rate
+
+    @classmethod
+    def probe(cls, rgb_folder, audio, fps=DEFAULT_FPS, width=None, height=None):
+        """
+        Reads the metadata of a video from its frame folder and audio track, without reading any frame. The frame rate
+        is not probed, neither the .rgb frames nor the WAV file record it.
+        :param rgb_folder: folder containing the .rgb frames
+        :param audio: wavio.Wav of the audio track, see audio.read_wav
+        :param fps: frame rate of the video, DEFAULT_FPS unless given
+        :param width: width of the frames, worked out from their file size if not given
+        :param height: height of the frames, worked out from their file size if not given
+        :return: VideoMetadata
+        """
+        filenames = list_frame_files(rgb_folder)
+        if filenames:
+            width, height = get_frame_size(os.path.getsize(os.path.join(rgb_folder, filenames[0])), width, height)
+        return cls(len(filenames), width or FRAME_WIDTH, height or FRAME_HEIGHT, fps, audio.rate)
+
+    @property
+    def samples_per_frame(self):
+        # not necessarily a whole number, see get_sample_index
+        return self.audio_rate / float(self.fps)
+
+    @property
+    def duration(self):
+        # length of the video in seconds
+        return self.frame_count / float(self.fps)
+
+    def get_sample_index(self, frame_num):
+        return get_sample_index(frame_num, self.audio_rate, self.fps)
+
+    def get_frame_count(self, seconds):
+        """
+        :return: number of frames lasting the given number of seconds
+        """
+        return int(round(seconds * self.fps))
+
+    def to_dict(self):
+        return {'frame_count': self.frame_count, 'width': self.width, 'height': self.height, 'fps': self.fps,
+                'audio_rate': self.audio_rate}
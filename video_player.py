@@ -1,9 +1,10 @@
-import datetime
+import io
 import os
 import re
-import time
 
-import pygame
+from audio_assembly import assemble_audio, get_wav_buffer
+from export import read_manifest
+from timeline import Timeline
 
 
 class VideoPlayer:
@@ -14,128 +15,74 @@ class VideoPlayer:
         self.audio_samples = audio_samples
         # fps
         self.fps = fps
-        pygame.init()
-        # init font first because it takes 8 seconds
-        self.font = pygame.font.SysFont('Sans', 18)
+        # font of the playback timer, pygame is only loaded once playback starts
+        self.font = None
 
     # play audio and display frames with an interval
     def play(self):
-        # display image
-        display_width = 320
-        display_height = 180
-
-        clock = pygame.time.Clock()
-        pause = False
-
-        gameDisplay = pygame.display.set_mode((display_width, display_height))
-        pygame.display.set_caption('Summarized Video')
-
-        x = 0
-        y = 0
-
-        folder = self.video_input
-
-        # control play speed
-        play_fps = self.fps
-        fps_step = 5
-        prev_fps_incr = False
-
-        pygame.mixer.init()
-        pygame.mixer.music.load(self.audio_samples)
-        # play once
-        pygame.mixer.music.play(0)
-
-        filenames = os.listdir(self.video_input)
+        from playback import init_playback, play_frames
+
+        self.font = init_playback()
+        # a summary exported as a manifest is played from the frames of its source folder
+        manifest = read_manifest(self.video_input)
+        if manifest is not None:
+            timeline = Timeline(manifest['selections'], manifest['fps'])
+            play_frames(timeline.get_frame_paths(manifest['source']), self.audio_samples, timeline.fps, self.font,
+                        segment_starts=timeline.segment_starts)
+            return
+        filenames = [filename for filename in os.listdir(self.video_input) if filename.endswith('.jpg')]
         filenames.sort(key=lambda x: int(re.sub('\D', '', x)))
-
-        start_time = time.time()
-        frame_num = 0
-        resized = False
-        total_video_time = datetime.timedelta(seconds=len(filenames) / 30.)
-        hours, remainder = divmod(total_video_time.total_seconds(), 3600)
-        total_minutes, total_seconds = divmod(remainder, 60)
-        total_seconds = '{total_seconds:02d}'.format(total_seconds=int(total_seconds))
-        total_minutes = '{total_minutes:02d}'.format(total_minutes=int(total_minutes))
-        minutes = 0
-        seconds = 0
-        while frame_num < len(filenames):
-            filename = filenames[frame_num]
-            for event in pygame.event.get():
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_p:
-                        if pause:
-                            pause = False
-                            start_time += time.time() - start_pause
-                            if not pygame.mixer.music.get_busy():
-                                pygame.mixer.music.unpause()
-                        else:
-                            pause = True
-                            start_pause = time.time()
-                            if pygame.mixer.music.get_busy():
-                                pygame.mixer.music.pause()
-                elif event.type == pygame.VIDEORESIZE:
-                    w, h = pygame.display.get_surface().get_size()
-                    w = int(w / 16.) * 16
-                    h = int(w / 16 * 9)
-                    gameDisplay = pygame.display.set_mode((w, h), pygame.RESIZABLE)
-                    resized = True
-
-            if not pause:
-                if resized:
-                    img = pygame.image.load(folder + filename)
-                    img = pygame.transform.scale(img, (w, h))
-                else:
-                    img = pygame.image.load(folder + filename)
-                sprite = pygame.sprite.Sprite()
-                sprite.image = img
-                sprite.rect = img.get_rect()
-                if frame_num % 30 == 0 and frame_num > 0:
-                    seconds += 1
-                    if seconds == 60:
-                        seconds = 0
-                        minutes += 1
-                text = self.font.render(
-                    '{minutes:02d}:{seconds:02d}/{total_minutes}:{total_seconds}'.format(minutes=minutes,
-                                                                                         seconds=seconds,
-                                                                                         total_minutes=total_minutes,
-                                                                                         total_seconds=total_seconds),
-                    True, (255, 255, 0))
-                sprite.image.blit(text, sprite.rect)
-                group = pygame.sprite.Group()
-                group.add(sprite)
-                gameDisplay.blit(img, (x, y))
-
-                pygame.display.update()
-
-                # wait twice as long for every 100th frame to achieve 30 fps (33.33ms/frame), otherwise wait for 33ms
-                if frame_num % 100 != 0:
-                    clock.tick(play_fps)
-                else:
-                    clock.tick(play_fps / 2)
-
-                end_time = time.time()
-
-                # change fps if too fast/slow
-                if frame_num % 100 != 0:
-
-                    if end_time - start_time < 1 / 30.0 * frame_num:
-
-                        if prev_fps_incr:
-                            fps_step = 5
-                        else:
-                            fps_step = fps_step / 2
-                        play_fps -= fps_step
-                        prev_fps_incr = False
-
-                    elif end_time - start_time > 1 / 30.0 * frame_num:
-
-                        if not prev_fps_incr:
-                            fps_step = 5
-                        else:
-                            fps_step = fps_step / 2
-                        play_fps += fps_step
-                        prev_fps_incr = True
-
-                frame_num += 1
-
-        pygame.quit()
+        play_frames([os.path.join(self.video_input, filename) for filename in filenames], self.audio_samples, self.fps,
+                    self.font)
+
+
+class SummaryPlayer:
+    """
+    Plays a summary straight from the original JPG folder and audio track.
+
+    The selections are a virtual timeline (see timeline.Timeline) over the original frames, so nothing is converted or
+    written before playing, and the player can seek, skip from one selection to the next or scrub anywhere in the
+    summary. The audio of the selections is spliced in memory the first time they are played. Keep the player to play
+    the summary again, or to preview other selections of the same video with play(selections).
+    """
+
+    def __init__(self, selections, video_input, audio_samples, fps, audio_rate, audio_sampwidth):
+        """
+        :param selections: (start, end) frame numbers of the summary, end non-inclusive, e.g. the result of
+        Evaluator.select_frames
+        :param video_input: folder of the original JPG frames
+        :param audio_samples: (samples, channels) array of the original audio track
+        """
+        self.video_input = video_input
+        self.audio_samples = audio_samples
+        self.fps = fps
+        self.audio_rate = audio_rate
+        self.audio_sampwidth = audio_sampwidth
+        self.font = None
+        self.timeline = None
+        # WAV file of the selections' audio, built when first played
+        self.audio = None
+        self.set_selections(selections)
+
+    def set_selections(self, selections):
+        self.timeline = Timeline(selections, self.fps)
+        self.audio = None
+
+    def get_audio(self):
+        if self.audio is None:
+            samples = assemble_audio(self.audio_samples, self.timeline.selections, self.audio_rate, self.fps)
+            self.audio = get_wav_buffer(samples, self.audio_rate, self.audio_sampwidth).getvalue()
+        return self.audio
+
+    def play(self, selections=None):
+        """
+        :param selections: selections to play instead of the current ones, they become the current ones
+        :return: (frames displayed, frames dropped)
+        """
+        from playback import init_playback, play_frames
+
+        if selections is not None:
+            self.set_selections(selections)
+        self.font = init_playback()
+        return play_frames(self.timeline.get_frame_paths(self.video_input), io.BytesIO(self.get_audio()), self.fps,
+                           self.font, segment_starts=self.timeline.segment_starts)
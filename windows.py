@@ -0,0 +1,54 @@
+import numpy as np
+
+
+def smooth(scores, size):
+    """
+    Moving average of the scores over size values, the result has the same length as scores
+    """
+    if size <= 1:
+        return scores
+    return np.convolve(scores, np.ones(size) / size, mode='same')
+
+
+def get_window_sums(scores, length):
+    """
+    Sums of every window of length consecutive scores in O(n), using prefix sums
+    :return: (len(scores) - length + 1,) array, the i-th value being the sum of scores[i:i + length]
+    """
+    prefix_sums = np.concatenate(([0.], np.cumsum(scores, dtype=np.float64)))
+    return prefix_sums[length:] - prefix_sums[:-length]
+
+
+def best_window(scores, length, smoothing=1):
+    """
+    Finds the window of length consecutive scores with the highest sum
+    :param scores: 1D array of scores, e.g. the motion scores between consecutive frames
+    :param smoothing: number of scores averaged before searching, 1 for none
+    :return: (start, end) indices into scores, end being non-inclusive
+    """
+    return top_windows(scores, length, 1, smoothing)[0]
+
+
+def top_windows(scores, length, k, smoothing=1):
+    """
+    Finds up to k non-overlapping windows of length consecutive scores, highest sum first. Each window is the best one
+    that does not overlap the windows picked before it, which takes O(k * n).
+    :param scores: 1D array of scores
+    :param k: maximum number of windows
+    :param smoothing: number of scores averaged before searching, 1 for none
+    :return: list of (start, end) indices into scores, sorted by start
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(scores) <= length:
+        return [(0, len(scores))]
+    window_sums = get_window_sums(smooth(scores, smoothing), length)
+    windows = []
+    for _ in range(k):
+        start = int(np.argmax(window_sums))
+        if window_sums[start] == -np.inf:
+            break
+        windows.append((start, start + length))
+        # rule out every window overlapping this one
+        window_sums[max(start - length + 1, 0):start + length] = -np.inf
+    windows.sort()
+    return windows
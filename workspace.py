@@ -0,0 +1,89 @@
+import errno
+import os
+import shutil
+import tempfile
+
+# folder in which the jobs create their workspaces, e.g. a tmpfs mount. The system's temporary folder if not set
+WORKSPACE_ROOT = os.environ.get('SUMMARY_WORKSPACE_ROOT')
+
+
+class Workspace:
+    """
+    Private temporary folder of a job, e.g. a conversion, for its intermediate files. Every workspace has a unique name,
+    so any number of jobs can run at once on a host, and it is deleted with everything in it when the job is done,
+    whether it succeeded or not:
+
+        with Workspace() as workspace:
+            converter.convert_video(workspace.get_path('video.mp4'))
+    """
+
+    def __init__(self, root=None, prefix='summary-'):
+        """
+        :param root: folder the workspace is created in, WORKSPACE_ROOT by default
+        """
+        self.root = root if root is not None else WORKSPACE_ROOT
+        self.prefix = prefix
+        self.path = None
+
+    def __enter__(self):
+        if self.root is not None:
+            os.makedirs(self.root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix=self.prefix, dir=self.root)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        shutil.rmtree(self.path, ignore_errors=True)
+        return False
+
+    def get_path(self, name):
+        return os.path.join(self.path, name)
+
+
+def publish(path, destination):
+    """
+    Moves a finished output, file or folder, to its destination, replacing the previous one. Readers of the destination
+    see either the previous output or the new one, never a partially written one, and concurrent jobs publishing to the
+    same destination do not fail, the last one wins.
+
+    Outputs on another filesystem than the destination (e.g. in a tmpfs workspace) are first copied next to the
+    destination, then renamed.
+    :param path: file or folder to publish, it is moved
+    :param destination: path of the published output
+    """
+    destination = os.path.abspath(destination)
+    parent = os.path.dirname(destination)
+    os.makedirs(parent, exist_ok=True)
+    prefix = '.{name}.'.format(name=os.path.basename(destination))
+    is_folder = os.path.isdir(path)
+
+    if os.stat(path).st_dev != os.stat(parent).st_dev:
+        # renames do not cross filesystems
+        staged = tempfile.mkdtemp(prefix=prefix, dir=parent)
+        if is_folder:
+            shutil.rmtree(staged)
+            shutil.copytree(path, staged)
+            shutil.rmtree(path)
+        else:
+            os.rmdir(staged)
+            shutil.move(path, staged)
+        path = staged
+
+    if not is_folder:
+        os.replace(path, destination)
+        return
+
+    # a folder cannot replace a non-empty one, the previous folder is moved aside and deleted afterwards
+    while True:
+        try:
+            os.rename(path, destination)
+            break
+        except OSError as e:
+            if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                raise
+        previous = tempfile.mkdtemp(prefix=prefix, dir=parent)
+        try:
+            os.replace(destination, previous)
+        except FileNotFoundError:
+            # another job moved it aside first
+            pass
+        shutil.rmtree(previous, ignore_errors=True)